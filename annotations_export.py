@@ -0,0 +1,411 @@
+import argparse
+import csv
+import heapq
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from data_store import (
+    ITEM_FILES,
+    load_collections,
+    load_groups,
+    load_texts,
+    lock_store,
+    read_item_groups,
+    resolve_text,
+    set_item_groups,
+)
+
+EXPORT_FORMATS = {"markdown": ".md", "csv": ".csv", "jsonl": ".jsonl"}
+GROUP_BY_OPTIONS = ["parent", "group", "collection"]
+
+CSV_COLUMNS = [
+    "key",
+    "type",
+    "parentKey",
+    "parentTitle",
+    "parentAuthors",
+    "pageLabel",
+    "color",
+    "text",
+    "comment",
+    "groups",
+]
+
+# Number of items that are kept in memory before they are written to the output files
+BUFFER_SIZE = 10000
+# Size of the chunks that are read from the data files
+READ_CHUNK_SIZE = 1024 * 1024
+# Number of merged items that are written to an output file at once
+MERGE_CHUNK_SIZE = 1000
+
+SEPARATOR_PATTERN = re.compile(r"[\s,]*")
+# Characters that may follow an element of an array
+ELEMENT_END_CHARACTERS = set(" \t\n\r,]")
+
+
+def iter_json_array(filename):
+    """Yield the elements of a JSON array file one by one without loading the whole file."""
+    if not os.path.exists(filename):
+        return
+
+    decoder = json.JSONDecoder()
+    with open(filename, "r", encoding="utf-8") as f:
+        buffer = f.read(READ_CHUNK_SIZE).lstrip()
+        if not buffer:
+            return
+        if not buffer.startswith("["):
+            raise ValueError(f"{filename} does not contain a JSON array")
+        position = 1
+        is_end_of_file = False
+
+        while True:
+            position = SEPARATOR_PATTERN.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError("Expecting value", buffer, position)
+                element, end = decoder.raw_decode(buffer, position)
+                if not is_end_of_file and (
+                    end == len(buffer) or buffer[end] not in ELEMENT_END_CHARACTERS
+                ):
+                    # A number at the end of the chunk (e.g. "12" of "12.5") may continue in the next one
+                    raise json.JSONDecodeError("Incomplete value", buffer, position)
+                position = end
+            except json.JSONDecodeError:
+                # The element continues in the next chunk
+                if is_end_of_file:
+                    raise
+                chunk = f.read(READ_CHUNK_SIZE)
+                is_end_of_file = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield element
+
+
+def get_output_name(name, key=None):
+    """Create a file name from a title, made unique with the key if given."""
+    file_name = re.sub(r"[^\w\- ]", "", name or "").strip().replace(" ", "_")[:80]
+    if key:
+        file_name = f"{file_name}_{key}" if file_name else key
+    return file_name or "Untitled"
+
+
+def get_top_item_key(parent_item):
+    """Return the key of the top-level item, e.g. the paper and not its PDF attachment."""
+    # Data exported before the top-level item keys were saved only has the direct parent
+    return parent_item.get("topKey") or parent_item.get("key")
+
+
+def get_parent_sort_key(item):
+    """Return the key ordering items by their top-level parent item."""
+    parent_item = item.get("parentItem", {})
+    return (parent_item.get("title") or "").lower(), get_top_item_key(parent_item) or ""
+
+
+def get_output_names(item, group_by, group_mapping, collection_mapping=None):
+    """Return (file name, heading) pairs of the output files an item is written to.
+
+    The file names contain the key of the parent item, group or collection, so
+    that items of different ones with the same name are not written to one file.
+    """
+    parent_item = item.get("parentItem", {})
+    if group_by == "parent":
+        # The parent item is the heading of each Markdown section already
+        return [
+            (
+                get_output_name(
+                    parent_item.get("title"), get_top_item_key(parent_item)
+                ),
+                None,
+            )
+        ]
+    if group_by == "group":
+        return [
+            (
+                get_output_name(group_mapping[group_key], group_key),
+                group_mapping[group_key],
+            )
+            for group_key in item.get("groups", [])
+            if group_key in group_mapping
+        ] or [("Ungrouped", "Ungrouped")]
+    if group_by == "collection":
+        collection_keys = parent_item.get("collectionKeys")
+        if collection_keys is None or not collection_mapping:
+            # Data exported before the collection keys were saved only has the names
+            output_names = [
+                (get_output_name(name), name)
+                for name in parent_item.get("collections", [])
+            ]
+        else:
+            output_names = [
+                (
+                    get_output_name(collection_mapping[collection_key], collection_key),
+                    collection_mapping[collection_key],
+                )
+                for collection_key in collection_keys
+                if collection_key in collection_mapping
+            ]
+        return output_names or [("Unfiled", "Unfiled")]
+    raise NotImplementedError(f"Unknown grouping: {group_by}")
+
+
+def format_markdown(items, last_parent_key):
+    """Format items as Markdown, starting a new section whenever the top-level parent item changes."""
+    lines = []
+    for item in items:
+        parent_item = item.get("parentItem", {})
+        if get_top_item_key(parent_item) != last_parent_key:
+            last_parent_key = get_top_item_key(parent_item)
+            lines.append(f"## {parent_item.get('title') or 'N/A'}\n")
+            if parent_item.get("authors"):
+                lines.append(f"{parent_item['authors']}\n")
+
+        if "annotationText" in item:
+            text = (item["annotationText"] or "").strip()
+            quote = "\n".join(f"> {line}" for line in text.splitlines()) or ">"
+            if item.get("annotationPageLabel"):
+                quote += f" (p. {item['annotationPageLabel']})"
+            lines.append(quote + "\n")
+            if item.get("annotationComment"):
+                lines.append(f"{item['annotationComment'].strip()}\n")
+        else:
+            lines.append(f"{(item.get('note') or '').strip()}\n")
+    return "\n".join(lines) + "\n", last_parent_key
+
+
+def format_csv(items):
+    """Format items as CSV rows (without the header)."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for item in items:
+        parent_item = item.get("parentItem", {})
+        is_annotation = "annotationText" in item
+        writer.writerow(
+            [
+                item["key"],
+                "annotation" if is_annotation else "note",
+                parent_item.get("key", ""),
+                parent_item.get("title", ""),
+                parent_item.get("authors", ""),
+                item.get("annotationPageLabel") or "",
+                item.get("annotationColor") or "",
+                (item["annotationText"] if is_annotation else item.get("note")) or "",
+                item.get("annotationComment") or "",
+                ";".join(item.get("groups", [])),
+            ]
+        )
+    return output.getvalue()
+
+
+def format_jsonl(items):
+    """Format items as JSON Lines."""
+    return "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+
+
+def iter_json_lines(filename):
+    """Yield the items of a JSON Lines file one by one."""
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class ExportWriter:
+    """Write buffered items to one output file per group, many files in parallel.
+
+    If is_sorted_by_parent is set, the items of each output file are written
+    sorted by their parent item, so that each parent item has one Markdown section.
+    The buffered items are then spooled as sorted runs to temporary files, which
+    are merged into the output files when the writer is closed.
+    """
+
+    def __init__(
+        self, output_dir, export_format, is_sorted_by_parent=False, max_workers=None
+    ):
+        self.output_dir = output_dir
+        self.export_format = export_format
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.buffers = {}
+        self.buffered_count = 0
+        self.headings = {}
+        self.written_names = set()
+        # Last parent item key per Markdown file, to continue its section
+        self.last_parent_keys = {}
+        self.spool_dir = tempfile.TemporaryDirectory() if is_sorted_by_parent else None
+        # Output file name -> file names of its spooled runs
+        self.run_filenames = {}
+
+    def add(self, output_name, heading, item):
+        self.headings[output_name] = heading
+        self.buffers.setdefault(output_name, []).append(item)
+        self.buffered_count += 1
+        if self.buffered_count >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered items, each output file in its own task."""
+        futures = []
+        for output_name, items in self.buffers.items():
+            if self.spool_dir is None:
+                futures.append(
+                    self.executor.submit(self.write_file, output_name, items)
+                )
+                continue
+            run_filenames = self.run_filenames.setdefault(output_name, [])
+            run_filename = os.path.join(
+                self.spool_dir.name, f"{output_name}_{len(run_filenames)}.jsonl"
+            )
+            run_filenames.append(run_filename)
+            futures.append(self.executor.submit(self.write_run, run_filename, items))
+        self.buffers = {}
+        self.buffered_count = 0
+        for future in futures:
+            future.result()
+
+    def write_file(self, output_name, items):
+        path = os.path.join(
+            self.output_dir, output_name + EXPORT_FORMATS[self.export_format]
+        )
+        is_new_file = output_name not in self.written_names
+        self.written_names.add(output_name)
+
+        with open(path, "w" if is_new_file else "a", encoding="utf-8", newline="") as f:
+            if self.export_format == "markdown":
+                if is_new_file and self.headings[output_name]:
+                    f.write(f"# {self.headings[output_name]}\n\n")
+                content, self.last_parent_keys[output_name] = format_markdown(
+                    items, self.last_parent_keys.get(output_name)
+                )
+                f.write(content)
+            elif self.export_format == "csv":
+                if is_new_file:
+                    csv.writer(f).writerow(CSV_COLUMNS)
+                f.write(format_csv(items))
+            else:
+                f.write(format_jsonl(items))
+
+    def write_run(self, run_filename, items):
+        """Spool items sorted by their parent item to a temporary file."""
+        items.sort(key=get_parent_sort_key)
+        with open(run_filename, "w", encoding="utf-8") as f:
+            f.write(format_jsonl(items))
+
+    def write_sorted_file(self, output_name, run_filenames):
+        """Merge the spooled runs of an output file into it."""
+        items = heapq.merge(
+            *(iter_json_lines(run_filename) for run_filename in run_filenames),
+            key=get_parent_sort_key,
+        )
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= MERGE_CHUNK_SIZE:
+                self.write_file(output_name, chunk)
+                chunk = []
+        if chunk:
+            self.write_file(output_name, chunk)
+
+    def close(self):
+        try:
+            self.flush()
+            futures = [
+                self.executor.submit(self.write_sorted_file, output_name, run_filenames)
+                for output_name, run_filenames in self.run_filenames.items()
+            ]
+            for future in futures:
+                future.result()
+        finally:
+            self.executor.shutdown()
+            if self.spool_dir is not None:
+                self.spool_dir.cleanup()
+
+
+def export_items(
+    data_dir,
+    output_dir,
+    export_format="markdown",
+    group_by="parent",
+    groups=None,
+    collections=None,
+):
+    """Stream the items of the data store into one output file per parent item, group or collection.
+
+    The items are streamed, but the unique texts are loaded at once, so the memory
+    used grows with the size of the text store. Returns the number of exported items.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise NotImplementedError(f"Unknown export format: {export_format}")
+    group_mapping = {group["key"]: group["name"] for group in groups or []}
+    collection_mapping = {
+        collection["key"]: collection["name"] for collection in collections or []
+    }
+    os.makedirs(output_dir, exist_ok=True)
+
+    item_count = 0
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        # The store is only locked while its files are copied, so that the texts and items
+        # are read from the same update without blocking syncs during the export
+        with lock_store(data_dir, shared=True):
+            # Only the unique texts are loaded, the items are streamed
+            texts = load_texts(data_dir)
+            item_groups = read_item_groups(data_dir)
+            for filename, _text_field in ITEM_FILES:
+                if os.path.exists(os.path.join(data_dir, filename)):
+                    shutil.copyfile(
+                        os.path.join(data_dir, filename),
+                        os.path.join(snapshot_dir, filename),
+                    )
+
+        # Files of groups and collections contain the items of several parent items
+        writer = ExportWriter(
+            output_dir,
+            export_format,
+            is_sorted_by_parent=export_format == "markdown" and group_by != "parent",
+        )
+        try:
+            for filename, text_field in ITEM_FILES:
+                for item in iter_json_array(os.path.join(snapshot_dir, filename)):
+                    set_item_groups(resolve_text(item, texts, text_field), item_groups)
+                    for output_name, heading in get_output_names(
+                        item, group_by, group_mapping, collection_mapping
+                    ):
+                        writer.add(output_name, heading, item)
+                    item_count += 1
+        finally:
+            writer.close()
+    return item_count
+
+
+def export_cli(args):
+    """Parse the command line arguments of the export command and run the export."""
+    parser = argparse.ArgumentParser(
+        prog="main.py export",
+        description="Export the annotations and notes grouped by parent item, group or collection.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(EXPORT_FORMATS),
+        default="markdown",
+        dest="export_format",
+    )
+    parser.add_argument("--group-by", choices=GROUP_BY_OPTIONS, default="parent")
+    parser.add_argument("--output", default="export", help="output directory")
+    options = parser.parse_args(args)
+
+    groups = load_groups("data")
+    item_count = export_items(
+        "data",
+        options.output,
+        options.export_format,
+        options.group_by,
+        groups,
+        load_collections("data"),
+    )
+    print(f"Exported {item_count} items to {options.output}")
+    return 0
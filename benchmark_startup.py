@@ -0,0 +1,112 @@
+"""Measure the startup time of the entry points of the Annotations Viewer.
+
+Run `python benchmark_startup.py` from the repository folder.
+The import times are measured with `python -X importtime`, the launch of the
+viewer with `python main.py --timing --quit-after-launch` (this needs GTK, a display
+and already exported data).
+"""
+
+import re
+import subprocess
+import sys
+import time
+
+# Lines of -X importtime: "import time: <self us> | <cumulative us> | <indentation><module>"
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+LAUNCH_TIME_PATTERN = re.compile(r"^(.+) after ([\d.]+) ms$")
+
+REPEAT_COUNT = 5
+SLOWEST_IMPORT_COUNT = 5
+
+
+def measure_import_time(module):
+    """Return the cumulative import time of a module and its slowest direct imports in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None, []
+
+    module_time = None
+    nested_imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+        cumulative_time = int(match.group(2))
+        depth = (len(match.group(3)) - 1) // 2
+        name = match.group(4)
+        # Imports are printed after their nested imports, which are indented one level more
+        if depth == 0 and name == module:
+            module_time = cumulative_time
+        elif depth == 1:
+            nested_imports.append((cumulative_time, name))
+        elif depth == 0:
+            nested_imports = []
+        if module_time is not None:
+            break
+    nested_imports.sort(reverse=True)
+    return module_time, nested_imports[:SLOWEST_IMPORT_COUNT]
+
+
+def measure_run_time(args):
+    """Return the fastest wall-clock time in milliseconds of running Python with the arguments."""
+    run_times = []
+    for _ in range(REPEAT_COUNT):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True)
+        run_times.append((time.perf_counter() - start_time) * 1000)
+    return min(run_times)
+
+
+def measure_launch_time():
+    """Return the launch events of the viewer with their time in milliseconds."""
+    try:
+        result = subprocess.run(
+            [sys.executable, "main.py", "--timing", "--quit-after-launch"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    except subprocess.TimeoutExpired:
+        return []
+    launch_events = []
+    for line in result.stdout.splitlines():
+        match = LAUNCH_TIME_PATTERN.match(line)
+        if match:
+            launch_events.append((match.group(1), float(match.group(2))))
+    return launch_events
+
+
+def print_import_time(module):
+    module_time, slowest_imports = measure_import_time(module)
+    if module_time is None:
+        print(f"import {module}: failed")
+        return
+    print(f"import {module}: {module_time / 1000:.1f} ms")
+    for cumulative_time, name in slowest_imports:
+        print(f"\t{name}: {cumulative_time / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    print("Import times (headless entry point, exporter and viewer):")
+    for module in ["main", "zotero_annotations_exporter", "viewer"]:
+        print_import_time(module)
+    print()
+
+    interpreter_time = measure_run_time(["-c", "pass"])
+    main_time = measure_run_time(["-c", "import main"])
+    print(f"Python interpreter startup: {interpreter_time:.1f} ms")
+    print(f"Python interpreter startup with main.py: {main_time:.1f} ms")
+    print()
+
+    launch_events = measure_launch_time()
+    if launch_events:
+        print("Viewer launch:")
+        for event, elapsed_ms in launch_events:
+            print(f"\t{event} after {elapsed_ms:.1f} ms")
+    else:
+        print("Viewer launch: failed (GTK 4 and a display are needed)")
@@ -0,0 +1,312 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+ANNOTATIONS_FILENAME = "annotations.json"
+NOTES_FILENAME = "notes.json"
+TEXTS_FILENAME = "texts.json"
+GROUPS_FILENAME = "groups.json"
+ITEM_GROUPS_FILENAME = "item_groups.json"
+COLLECTIONS_FILENAME = "collections.json"
+LOCK_FILENAME = ".lock"
+
+# Data files of the items with the field holding their text, which is kept in the text store
+ITEM_FILES = [(ANNOTATIONS_FILENAME, "annotationText"), (NOTES_FILENAME, "note")]
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalize a text so that near-identical texts (e.g. differing in whitespace) are equal."""
+    text = unicodedata.normalize("NFKC", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def hash_text(text):
+    """Return the hash of the text, used as key in the text store.
+
+    The exact text is hashed, so that each text is restored as it was saved.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def resolve_text(item, texts, text_field):
+    """Restore the text of an item loaded from the store in place."""
+    text_hash = item.get("textHash")
+    if text_hash in texts:
+        item[text_field] = texts[text_hash]
+    elif text_field not in item:
+        # The text is missing from the text store
+        item[text_field] = ""
+    elif item[text_field]:
+        # Items saved before the text store was added contain their text
+        item["textHash"] = hash_text(item[text_field])
+    return item
+
+
+def store_text(item, texts, text_field):
+    """Add the text of an item to the texts and return the item as it is saved.
+
+    The saved item contains neither its text nor its groups, which are saved separately.
+    """
+    if not item.get(text_field):
+        excluded_keys = {"textHash", "groups"}
+    else:
+        text_hash = hash_text(item[text_field])
+        item["textHash"] = text_hash
+        texts.setdefault(text_hash, item[text_field])
+        excluded_keys = {text_field, "groups"}
+    return {key: value for key, value in item.items() if key not in excluded_keys}
+
+
+def load_json(filename, default):
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def save_json(data, filename):
+    """Save data to a JSON file atomically, so readers never see a partially written file."""
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    # Unlike tempfile, open creates the file with the permissions given by the umask
+    temp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp_filename)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+@contextmanager
+def lock_store(data_dir="data", shared=False):
+    """Lock the data store across processes and threads while reading (shared) or writing.
+
+    The exporter and the viewer may run at the same time, so all files of the store
+    are only read or written while holding this lock.
+    """
+    if shared and not os.path.isdir(data_dir):
+        # There is nothing to read yet, and reading must not create the data folder,
+        # whose absence makes main.py run the exporter for the first time
+        yield
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, LOCK_FILENAME), "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            # Windows only supports exclusive locks
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError as e:
+                    # Locking gives up after about 10 seconds, but a sync may take longer
+                    if e.errno != errno.EDEADLOCK:
+                        raise
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_texts(data_dir="data"):
+    """Load the text store, mapping text hashes to the texts."""
+    return load_json(os.path.join(data_dir, TEXTS_FILENAME), {})
+
+
+def read_item_groups(data_dir="data"):
+    """Read the keys of the groups of each item (the store must be locked)."""
+    item_groups = load_json(os.path.join(data_dir, ITEM_GROUPS_FILENAME), None)
+    if item_groups is None:
+        # Earlier versions saved the groups in the items
+        item_groups = {
+            item["key"]: item["groups"]
+            for filename, _text_field in ITEM_FILES
+            for item in load_json(os.path.join(data_dir, filename), [])
+            if item.get("groups")
+        }
+    return item_groups
+
+
+def set_item_groups(item, item_groups):
+    """Set the groups of an item loaded from the store in place."""
+    groups = item_groups.get(item["key"])
+    if groups:
+        item["groups"] = list(groups)
+    else:
+        item.pop("groups", None)
+    return item
+
+
+def read_store(data_dir="data"):
+    """Read the annotations and notes with their texts and groups restored (the store must be locked)."""
+    texts = load_texts(data_dir)
+    item_groups = read_item_groups(data_dir)
+    annotations, notes = (
+        [
+            set_item_groups(resolve_text(item, texts, text_field), item_groups)
+            for item in load_json(os.path.join(data_dir, filename), [])
+        ]
+        for filename, text_field in ITEM_FILES
+    )
+    return annotations, notes
+
+
+def write_store(annotations, notes, data_dir="data"):
+    """Write the annotations and notes, storing each unique text only once (the store must be locked).
+
+    The groups of the items are not written, they are changed with update_item_groups.
+    """
+    item_groups_filename = os.path.join(data_dir, ITEM_GROUPS_FILENAME)
+    if not os.path.exists(item_groups_filename):
+        # Keep the groups of stores written by earlier versions, which are removed from the items
+        save_json(
+            {
+                item["key"]: item["groups"]
+                for item in annotations + notes
+                if item.get("groups")
+            },
+            item_groups_filename,
+        )
+
+    # The text store is rebuilt from all items, so texts no longer used are dropped
+    texts = {}
+    stored_items = [
+        [store_text(item, texts, text_field) for item in items]
+        for items, (_filename, text_field) in zip([annotations, notes], ITEM_FILES)
+    ]
+
+    # The texts are written first, so that they contain every hash the items refer to
+    save_json(texts, os.path.join(data_dir, TEXTS_FILENAME))
+    for items, (filename, _text_field) in zip(stored_items, ITEM_FILES):
+        save_json(items, os.path.join(data_dir, filename))
+
+
+def load_store(data_dir="data"):
+    """Load the annotations and notes with their texts and groups restored."""
+    with lock_store(data_dir, shared=True):
+        return read_store(data_dir)
+
+
+def merge_items(existing_items, items):
+    """Refresh existing items with the given items in place, keeping their groups.
+
+    Returns the number of new and of refreshed items.
+    """
+    existing_items_by_key = {item["key"]: item for item in existing_items}
+    new_item_count = 0
+    refreshed_item_count = 0
+    for item in items:
+        existing_item = existing_items_by_key.get(item["key"])
+        if existing_item is None:
+            existing_items.append(item)
+            new_item_count += 1
+            continue
+
+        # The groups are assigned in the viewer and unknown to Zotero
+        refreshed_item = {key: value for key, value in item.items() if key != "groups"}
+        if "groups" in existing_item:
+            refreshed_item["groups"] = existing_item["groups"]
+        current_item = {
+            key: value for key, value in existing_item.items() if key != "textHash"
+        }
+        if refreshed_item != current_item:
+            existing_item.clear()
+            existing_item.update(refreshed_item)
+            refreshed_item_count += 1
+    return new_item_count, refreshed_item_count
+
+
+def update_store(annotations, notes, data_dir="data"):
+    """Add new and refresh existing annotations and notes, keeping the groups assigned in the viewer.
+
+    Returns the number of new and of refreshed items.
+    """
+    with lock_store(data_dir):
+        existing_annotations, existing_notes = read_store(data_dir)
+        new_annotation_count, refreshed_annotation_count = merge_items(
+            existing_annotations, annotations
+        )
+        new_note_count, refreshed_note_count = merge_items(existing_notes, notes)
+        new_item_count = new_annotation_count + new_note_count
+        refreshed_item_count = refreshed_annotation_count + refreshed_note_count
+        if new_item_count or refreshed_item_count:
+            write_store(existing_annotations, existing_notes, data_dir)
+    return new_item_count, refreshed_item_count
+
+
+def update_item_groups(item_keys, group_key, is_added, data_dir="data"):
+    """Add a group to or remove it from the items with the given keys.
+
+    Only this change is merged into the current item groups, so group changes of
+    other items are kept. The annotations and notes are not rewritten.
+    """
+    with lock_store(data_dir):
+        item_groups = read_item_groups(data_dir)
+        for item_key in item_keys:
+            groups = item_groups.get(item_key, [])
+            if is_added and group_key not in groups:
+                item_groups[item_key] = groups + [group_key]
+            elif not is_added and group_key in groups:
+                groups.remove(group_key)
+                if not groups:
+                    del item_groups[item_key]
+        save_json(item_groups, os.path.join(data_dir, ITEM_GROUPS_FILENAME))
+
+
+def load_groups(data_dir="data"):
+    """Load the groups created in the viewer."""
+    return load_json(os.path.join(data_dir, GROUPS_FILENAME), [])
+
+
+def add_group(group_name, data_dir="data"):
+    """Create a new group and return the current list of all groups."""
+    with lock_store(data_dir):
+        groups = load_groups(data_dir)
+        # Generate a new group key that is not used yet
+        group_keys = {group["key"] for group in groups}
+        group_number = len(groups) + 1
+        while f"group{group_number}" in group_keys:
+            group_number += 1
+        groups.append({"key": f"group{group_number}", "name": group_name})
+        save_json(groups, os.path.join(data_dir, GROUPS_FILENAME))
+    return groups
+
+
+def load_collections(data_dir="data"):
+    """Load the collection tree saved by the exporter."""
+    return load_json(os.path.join(data_dir, COLLECTIONS_FILENAME), [])
+
+
+def save_collections(collections, data_dir="data"):
+    """Save the collection tree, replacing the previous one."""
+    with lock_store(data_dir):
+        save_json(collections, os.path.join(data_dir, COLLECTIONS_FILENAME))
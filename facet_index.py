@@ -0,0 +1,87 @@
+TYPE_FACET = "Type"
+GROUP_FACET = "Group"
+COLOR_FACET = "Color"
+TAG_FACET = "Tag"
+AUTHOR_FACET = "Author"
+FACETS = [TYPE_FACET, GROUP_FACET, COLOR_FACET, TAG_FACET, AUTHOR_FACET]
+
+ANNOTATION_TYPE = "Annotations"
+NOTE_TYPE = "Notes"
+
+
+def get_facet_values(item):
+    """Return the values of each facet of an annotation or note."""
+    authors = item.get("parentItem", {}).get("authors")
+    color = item.get("annotationColor")
+    return {
+        TYPE_FACET: (ANNOTATION_TYPE if "annotationText" in item else NOTE_TYPE,),
+        GROUP_FACET: tuple(item.get("groups", [])),
+        COLOR_FACET: (color,) if color else (),
+        TAG_FACET: tuple(item.get("tags", [])),
+        AUTHOR_FACET: (authors,) if authors else (),
+    }
+
+
+def intersect_key_sets(key_sets):
+    """Intersect sets of item keys, ignoring None (no restriction). Returns None if all are None."""
+    key_sets = sorted(
+        (keys for keys in key_sets if keys is not None), key=len
+    )  # Starting with the smallest set keeps the intersections small
+    if not key_sets:
+        return None
+    return key_sets[0].intersection(*key_sets[1:])
+
+
+class FacetIndex:
+    """Posting sets from each facet value to the keys of the items having it.
+
+    Filtering by facet values and counting the items per facet value are set
+    intersections, so no items have to be scanned when filters change.
+    """
+
+    def __init__(self, items=()):
+        # Facet -> value -> keys of the items with the value
+        self.postings = {facet: {} for facet in FACETS}
+        # Item key -> facet values of the item (for removing it again)
+        self.item_values = {}
+        for item in items:
+            self.add_item(item)
+
+    def add_item(self, item):
+        """Add an item, replacing any item with the same key."""
+        key = item["key"]
+        self.remove_item(key)
+        facet_values = get_facet_values(item)
+        self.item_values[key] = facet_values
+        for facet, values in facet_values.items():
+            for value in values:
+                self.postings[facet].setdefault(value, set()).add(key)
+
+    def remove_item(self, key):
+        """Remove an item if it is in the index."""
+        facet_values = self.item_values.pop(key, None)
+        if facet_values is None:
+            return
+        for facet, values in facet_values.items():
+            for value in values:
+                keys = self.postings[facet][value]
+                keys.discard(key)
+                if not keys:
+                    del self.postings[facet][value]
+
+    def get_values(self, facet):
+        """Return the values of a facet, sorted by name."""
+        return sorted(self.postings[facet], key=str.lower)
+
+    def get_keys(self, facet, value):
+        """Return the keys of the items with the facet value."""
+        return self.postings[facet].get(value, set())
+
+    def count(self, facet, allowed_keys=None):
+        """Return the number of allowed items per value of a facet (all items if allowed_keys is None)."""
+        if allowed_keys is None:
+            return {value: len(keys) for value, keys in self.postings[facet].items()}
+        return {
+            value: len(keys.intersection(allowed_keys))
+            for value, keys in self.postings[facet].items()
+        }
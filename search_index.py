@@ -0,0 +1,260 @@
+import heapq
+import math
+import re
+from operator import itemgetter
+
+# Weights of the searchable fields when scoring a document
+FIELD_WEIGHTS = (1.0, 0.6, 0.4)  # text, title, authors
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Minimum trigram similarity (Dice coefficient) for a word to match a search word
+MIN_SIMILARITY = 0.4
+# Shorter search words only match the same word or words starting with them, as
+# a single shared trigram makes them similar to unrelated short words
+MIN_FUZZY_WORD_LENGTH = 4
+# Maximum number of words of the library that a search word is expanded to
+MAX_EXPANSIONS = 20
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split a text into lowercase words."""
+    if not text:
+        return []
+    return WORD_PATTERN.findall(text.lower())
+
+
+def get_trigrams(word):
+    """Return the trigrams of a word, padded so that short words and word starts match too."""
+    padded_word = f"  {word} "
+    return {padded_word[i : i + 3] for i in range(len(padded_word) - 2)}
+
+
+class SearchIndex:
+    """Inverted index for ranked, typo-tolerant search over annotations and notes.
+
+    Each document has three fields (text, title and authors). Search words are
+    expanded to similar words of the library with a trigram index over the
+    vocabulary, and documents are scored with BM25 over the weighted fields.
+    """
+
+    def __init__(self):
+        # Word -> {document key -> term frequency per field}
+        self.postings = {}
+        # Trigram -> words of the vocabulary containing it
+        self.trigram_index = {}
+        # Document key -> length per field
+        self.document_lengths = {}
+        # Document key -> words of the document (for removing it again)
+        self.document_words = {}
+        self.total_field_lengths = [0] * len(FIELD_WEIGHTS)
+        # Document key -> field weight divided by the BM25 length normalization per field,
+        # recomputed on the next search after documents were added or removed
+        self.document_norms = None
+
+    def __len__(self):
+        return len(self.document_lengths)
+
+    def __contains__(self, key):
+        return key in self.document_lengths
+
+    def add_document(self, key, text, title, authors):
+        """Add a document, replacing any document with the same key."""
+        if key in self.document_lengths:
+            self.remove_document(key)
+        self.document_norms = None
+
+        fields = (tokenize(text), tokenize(title), tokenize(authors))
+        lengths = tuple(len(words) for words in fields)
+        self.document_lengths[key] = lengths
+        for field_index, length in enumerate(lengths):
+            self.total_field_lengths[field_index] += length
+
+        # Count each word per field first, so the postings are updated once per word
+        word_frequencies = {}
+        for field_index, words in enumerate(fields):
+            for word in words:
+                frequencies = word_frequencies.get(word)
+                if frequencies is None:
+                    frequencies = word_frequencies[word] = [0] * len(FIELD_WEIGHTS)
+                frequencies[field_index] += 1
+        self.document_words[key] = word_frequencies.keys()
+
+        for word, frequencies in word_frequencies.items():
+            documents = self.postings.get(word)
+            if documents is None:
+                documents = self.postings[word] = {}
+                for trigram in get_trigrams(word):
+                    self.trigram_index.setdefault(trigram, set()).add(word)
+            documents[key] = frequencies
+
+    def remove_document(self, key):
+        """Remove a document if it is in the index."""
+        lengths = self.document_lengths.pop(key, None)
+        if lengths is None:
+            return
+        self.document_norms = None
+        for field_index, length in enumerate(lengths):
+            self.total_field_lengths[field_index] -= length
+
+        for word in self.document_words.pop(key):
+            documents = self.postings[word]
+            del documents[key]
+            if not documents:
+                del self.postings[word]
+                for trigram in get_trigrams(word):
+                    words = self.trigram_index[trigram]
+                    words.discard(word)
+                    if not words:
+                        del self.trigram_index[trigram]
+
+    def get_document_norms(self):
+        """Return the BM25 length normalization of all documents, weighted per field."""
+        if self.document_norms is None:
+            document_count = len(self.document_lengths)
+            average_lengths = [
+                max(total_length / document_count, 1) if document_count else 1
+                for total_length in self.total_field_lengths
+            ]
+            self.document_norms = {
+                key: tuple(
+                    field_weight / (1 - B + B * length / average_length)
+                    for field_weight, length, average_length in zip(
+                        FIELD_WEIGHTS, lengths, average_lengths
+                    )
+                )
+                for key, lengths in self.document_lengths.items()
+            }
+        return self.document_norms
+
+    def expand_word(self, search_word):
+        """Return (word, similarity) pairs of the most similar words in the vocabulary."""
+        is_fuzzy = len(search_word) >= MIN_FUZZY_WORD_LENGTH
+        search_trigrams = get_trigrams(search_word)
+        shared_trigram_counts = {}
+        for trigram in search_trigrams:
+            for word in self.trigram_index.get(trigram, ()):
+                shared_trigram_counts[word] = shared_trigram_counts.get(word, 0) + 1
+
+        similar_words = []
+        for word, shared_count in shared_trigram_counts.items():
+            # The trigram count of a padded word equals its length + 1
+            similarity = 2 * shared_count / (len(search_trigrams) + len(word) + 1)
+            if word.startswith(search_word):
+                # Words that are still being typed should match their completions
+                similarity = max(similarity, MIN_SIMILARITY)
+            elif not is_fuzzy:
+                continue
+            if similarity >= MIN_SIMILARITY:
+                similar_words.append((word, similarity))
+        return heapq.nlargest(MAX_EXPANSIONS, similar_words, key=itemgetter(1))
+
+    def expand_query(self, query):
+        """Return the expansions of each word of the query, rarest word first.
+
+        Starting with the rarest word keeps the candidates of the other words few.
+        """
+        expansions = [
+            self.expand_word(search_word) for search_word in set(tokenize(query))
+        ]
+        expansions.sort(
+            key=lambda words: sum(
+                len(self.postings[word]) for word, _similarity in words
+            )
+        )
+        return expansions
+
+    def score_word(self, expanded_words, candidate_keys, document_norms):
+        """Score the candidates (all documents if None) containing an expansion of a search word.
+
+        Each document is scored only by its best matching expansion.
+        """
+        document_count = len(self.document_lengths)
+        word_scores = {}
+        for word, similarity in expanded_words:
+            documents = self.postings[word]
+            idf = math.log(
+                1 + (document_count - len(documents) + 0.5) / (len(documents) + 0.5)
+            )
+            word_weight = similarity * idf * (K1 + 1)
+            if candidate_keys is None:
+                matches = documents.items()
+            elif len(candidate_keys) < len(documents):
+                matches = (
+                    (key, documents[key]) for key in candidate_keys if key in documents
+                )
+            else:
+                matches = (
+                    (key, frequencies)
+                    for key, frequencies in documents.items()
+                    if key in candidate_keys
+                )
+            for key, (text_frequency, title_frequency, authors_frequency) in matches:
+                text_norm, title_norm, authors_norm = document_norms[key]
+                weighted_frequency = (
+                    text_frequency * text_norm
+                    + title_frequency * title_norm
+                    + authors_frequency * authors_norm
+                )
+                score = word_weight * weighted_frequency / (weighted_frequency + K1)
+                if score > word_scores.get(key, 0):
+                    word_scores[key] = score
+        return word_scores
+
+    def search(self, query, limit, allowed_keys=None):
+        """Return the keys of the best documents matching every word of the query, best first.
+
+        At most limit keys are returned. If allowed_keys is given, only these
+        documents are considered, so passing the keys found by find_matching_keys
+        limits the scoring to the matching documents.
+        """
+        if not self.document_lengths:
+            return []
+        document_norms = self.get_document_norms()
+
+        scores = None
+        for expanded_words in self.expand_query(query):
+            # After the first word, only documents matching all words so far are scored
+            word_scores = self.score_word(
+                expanded_words,
+                allowed_keys if scores is None else scores,
+                document_norms,
+            )
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    key: scores[key] + score for key, score in word_scores.items()
+                }
+            if not scores:
+                return []
+
+        if not scores:
+            return []
+        best_documents = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [key for key, _score in best_documents]
+
+    def find_matching_keys(self, query):
+        """Return the keys of all documents matching every word of the query.
+
+        These are the documents ranked by search, without the limit.
+        """
+        matching_keys = None
+        for expanded_words in self.expand_query(query):
+            postings = [self.postings[word] for word, _similarity in expanded_words]
+            if matching_keys is None:
+                matching_keys = set().union(*postings)
+            else:
+                # Only the documents matching all words so far are checked
+                matching_keys = {
+                    key
+                    for key in matching_keys
+                    if any(key in documents for documents in postings)
+                }
+            if not matching_keys:
+                break
+        return matching_keys or set()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are in the repository folder, which is not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,156 @@
+import json
+import os
+import random
+
+import pytest
+
+import annotations_export
+from annotations_export import export_items, get_output_names, iter_json_array
+from data_store import update_item_groups, update_store
+
+
+def write_json(filename, data, **options):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(data, f, **options)
+
+
+def create_annotation(key, text, parent_key, top_key, title, collection_keys=()):
+    return {
+        "key": key,
+        "parentItem": {
+            "key": parent_key,
+            "topKey": top_key,
+            "title": title,
+            "authors": "Author",
+            "collections": [],
+            "collectionKeys": list(collection_keys),
+        },
+        "annotationText": text,
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16])
+def test_iter_json_array_reads_elements_across_chunks(
+    tmp_path, monkeypatch, chunk_size
+):
+    monkeypatch.setattr(annotations_export, "READ_CHUNK_SIZE", chunk_size)
+    random.seed(chunk_size)
+    data = [
+        random.choice(
+            [
+                random.randint(-(10**6), 10**6),
+                random.random() * 1000,
+                'text, with [brackets] and "quotes"',
+                {"key": "A", "values": [1, 22, 333]},
+                [1, [2, 3]],
+                True,
+                None,
+            ]
+        )
+        for _ in range(100)
+    ]
+    filename = str(tmp_path / "data.json")
+    for options in [{}, {"indent": 4}, {"separators": (",", ":")}]:
+        write_json(filename, data, **options)
+        assert list(iter_json_array(filename)) == data
+
+
+def test_iter_json_array_handles_empty_and_missing_files(tmp_path):
+    filename = str(tmp_path / "data.json")
+    assert list(iter_json_array(filename)) == []
+    write_json(filename, [])
+    assert list(iter_json_array(filename)) == []
+
+
+def test_iter_json_array_rejects_other_json(tmp_path):
+    filename = str(tmp_path / "data.json")
+    write_json(filename, {"key": "A"})
+    with pytest.raises(ValueError):
+        list(iter_json_array(filename))
+
+
+def test_output_names_contain_the_group_and_collection_keys():
+    item = create_annotation("A", "text", "PDF1", "P1", "Paper", ["C1", "C2"])
+    item["groups"] = ["group1", "group2"]
+    group_mapping = {"group1": "C++", "group2": "C"}
+    collection_mapping = {"C1": "Sub", "C2": "Sub"}
+
+    assert get_output_names(item, "parent", group_mapping) == [("Paper_P1", None)]
+    assert get_output_names(item, "group", group_mapping) == [
+        ("C_group1", "C++"),
+        ("C_group2", "C"),
+    ]
+    assert get_output_names(item, "collection", {}, collection_mapping) == [
+        ("Sub_C1", "Sub"),
+        ("Sub_C2", "Sub"),
+    ]
+    assert get_output_names(
+        create_annotation("B", "text", "P2", "P2", "Other"), "collection", {}, {}
+    ) == [("Unfiled", "Unfiled")]
+
+
+def test_export_writes_one_section_per_top_level_item(tmp_path, monkeypatch):
+    # Small buffers, so the items of each file are spooled in several sorted runs
+    monkeypatch.setattr(annotations_export, "BUFFER_SIZE", 3)
+    monkeypatch.setattr(annotations_export, "MERGE_CHUNK_SIZE", 2)
+    data_dir = str(tmp_path / "data")
+    output_dir = str(tmp_path / "export")
+    annotations = [
+        (
+            create_annotation(
+                f"A{index}", f"Text {index}", "PDF1", "P1", "Paper", ["C1"]
+            )
+            if index % 2
+            else create_annotation(
+                f"A{index}", f"Text {index}", "P2", "P2", "Book", ["C1"]
+            )
+        )
+        for index in range(10)
+    ]
+    notes = [
+        {
+            "key": "N1",
+            "parentItem": dict(annotations[1]["parentItem"], key="P1"),
+            "note": "Note",
+        }
+    ]
+    update_store(annotations, notes, data_dir)
+
+    assert export_items(data_dir, output_dir, "markdown", "parent") == 11
+    assert sorted(os.listdir(output_dir)) == ["Book_P2.md", "Paper_P1.md"]
+
+    collections = [{"key": "C1", "name": "Sub", "parentCollection": None}]
+    assert (
+        export_items(data_dir, output_dir, "markdown", "collection", None, collections)
+        == 11
+    )
+    with open(os.path.join(output_dir, "Sub_C1.md"), "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "# Sub"
+    assert [line for line in lines if line.startswith("## ")] == ["## Book", "## Paper"]
+    # The items of each section keep their order in the store
+    texts = [line for line in lines if line.startswith("> ") or line == "Note"]
+    assert texts == [f"> Text {index}" for index in range(0, 10, 2)] + [
+        f"> Text {index}" for index in range(1, 10, 2)
+    ] + ["Note"]
+
+
+def test_export_writes_the_items_of_each_group(tmp_path):
+    data_dir = str(tmp_path / "data")
+    output_dir = str(tmp_path / "export")
+    update_store(
+        [
+            create_annotation("A", "a", "P1", "P1", "Paper"),
+            create_annotation("B", "b", "P1", "P1", "Paper"),
+        ],
+        [],
+        data_dir,
+    )
+    update_item_groups(["A"], "group1", True, data_dir)
+
+    export_items(
+        data_dir, output_dir, "jsonl", "group", [{"key": "group1", "name": "C++"}]
+    )
+    assert sorted(os.listdir(output_dir)) == ["C_group1.jsonl", "Ungrouped.jsonl"]
+    with open(os.path.join(output_dir, "C_group1.jsonl"), "r", encoding="utf-8") as f:
+        assert [json.loads(line)["key"] for line in f] == ["A"]
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+
+import pytest
+
+from data_store import (
+    ITEM_GROUPS_FILENAME,
+    add_group,
+    load_store,
+    lock_store,
+    merge_items,
+    read_store,
+    save_json,
+    update_item_groups,
+    update_store,
+    write_store,
+)
+
+
+def create_annotation(key, text, **fields):
+    return {"key": key, "annotationText": text, **fields}
+
+
+def read_json(data_dir, filename):
+    with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_merge_items_adds_new_and_refreshes_changed_items():
+    existing_items = [
+        create_annotation("A", "old", groups=["group1"]),
+        create_annotation("B", "same"),
+    ]
+    new_item_count, refreshed_item_count = merge_items(
+        existing_items,
+        [
+            create_annotation("A", "new"),
+            create_annotation("B", "same"),
+            create_annotation("C", "added"),
+        ],
+    )
+
+    assert (new_item_count, refreshed_item_count) == (1, 1)
+    assert existing_items == [
+        create_annotation("A", "new", groups=["group1"]),
+        create_annotation("B", "same"),
+        create_annotation("C", "added"),
+    ]
+
+
+def test_merge_items_ignores_text_hash():
+    existing_items = [create_annotation("A", "text", textHash="hash")]
+    assert merge_items(existing_items, [create_annotation("A", "text")]) == (0, 0)
+
+
+def test_update_store_refreshes_items_and_keeps_groups(tmp_path):
+    data_dir = str(tmp_path)
+    update_store([create_annotation("A", "old")], [], data_dir)
+    update_item_groups(["A"], "group1", True, data_dir)
+
+    assert update_store([create_annotation("A", "new")], [], data_dir) == (0, 1)
+    annotations, notes = load_store(data_dir)
+    assert annotations[0]["annotationText"] == "new"
+    assert annotations[0]["groups"] == ["group1"]
+    assert notes == []
+
+
+def test_update_store_keeps_near_identical_texts(tmp_path):
+    data_dir = str(tmp_path)
+    annotations = [
+        create_annotation("A", "foo  bar"),
+        create_annotation("B", "foo bar"),
+        create_annotation("C", "ﬁsh"),
+        create_annotation("D", "fish"),
+    ]
+    update_store([dict(item) for item in annotations], [], data_dir)
+
+    loaded_annotations, _notes = load_store(data_dir)
+    assert [item["annotationText"] for item in loaded_annotations] == [
+        item["annotationText"] for item in annotations
+    ]
+    # Unchanged items are not rewritten on the next sync
+    assert update_store([dict(item) for item in annotations], [], data_dir) == (0, 0)
+
+
+def test_update_store_stores_duplicate_texts_once(tmp_path):
+    data_dir = str(tmp_path)
+    update_store(
+        [create_annotation("A", "same"), create_annotation("B", "same")],
+        [{"key": "N", "note": "same"}],
+        data_dir,
+    )
+
+    assert list(read_json(data_dir, "texts.json").values()) == ["same"]
+    assert all(
+        "annotationText" not in item for item in read_json(data_dir, "annotations.json")
+    )
+
+
+def test_update_item_groups_adds_and_removes_groups(tmp_path):
+    data_dir = str(tmp_path)
+    update_store(
+        [create_annotation("A", "a"), create_annotation("B", "b")], [], data_dir
+    )
+
+    update_item_groups(["A", "B"], "group1", True, data_dir)
+    update_item_groups(["A"], "group2", True, data_dir)
+    update_item_groups(["A"], "group1", True, data_dir)
+    assert read_json(data_dir, ITEM_GROUPS_FILENAME) == {
+        "A": ["group1", "group2"],
+        "B": ["group1"],
+    }
+
+    update_item_groups(["A", "B"], "group1", False, data_dir)
+    assert read_json(data_dir, ITEM_GROUPS_FILENAME) == {"A": ["group2"]}
+    annotations, _notes = load_store(data_dir)
+    assert [item.get("groups") for item in annotations] == [["group2"], None]
+
+
+def test_update_item_groups_does_not_rewrite_items(tmp_path):
+    data_dir = str(tmp_path)
+    update_store([create_annotation("A", "a")], [], data_dir)
+    annotations_filename = os.path.join(data_dir, "annotations.json")
+    modified_time = os.stat(annotations_filename).st_mtime_ns
+
+    update_item_groups(["A"], "group1", True, data_dir)
+    assert os.stat(annotations_filename).st_mtime_ns == modified_time
+
+
+def test_groups_saved_in_items_by_earlier_versions_are_kept(tmp_path):
+    data_dir = str(tmp_path)
+    save_json(
+        [create_annotation("A", "a", groups=["group1"]), create_annotation("B", "b")],
+        os.path.join(data_dir, "annotations.json"),
+    )
+
+    update_item_groups(["B"], "group2", True, data_dir)
+    assert read_json(data_dir, ITEM_GROUPS_FILENAME) == {
+        "A": ["group1"],
+        "B": ["group2"],
+    }
+
+    update_store([create_annotation("A", "changed")], [], data_dir)
+    annotations, _notes = load_store(data_dir)
+    assert [item.get("groups") for item in annotations] == [["group1"], ["group2"]]
+
+
+def test_write_store_migrates_groups_saved_in_items(tmp_path):
+    data_dir = str(tmp_path)
+    with lock_store(data_dir):
+        write_store([create_annotation("A", "a", groups=["group1"])], [], data_dir)
+
+    assert "groups" not in read_json(data_dir, "annotations.json")[0]
+    assert read_json(data_dir, ITEM_GROUPS_FILENAME) == {"A": ["group1"]}
+    with lock_store(data_dir, shared=True):
+        assert read_store(data_dir)[0][0]["groups"] == ["group1"]
+
+
+def test_add_group_uses_unused_keys(tmp_path):
+    data_dir = str(tmp_path)
+    save_json(
+        [{"key": "group2", "name": "Second"}],
+        os.path.join(data_dir, "groups.json"),
+    )
+
+    groups = add_group("New", data_dir)
+    assert groups == [
+        {"key": "group2", "name": "Second"},
+        {"key": "group3", "name": "New"},
+    ]
+    assert read_json(data_dir, "groups.json") == groups
+
+
+def test_save_json_keeps_file_mode(tmp_path):
+    filename = str(tmp_path / "data.json")
+    save_json([1], filename)
+    os.chmod(filename, 0o640)
+
+    save_json([2], filename)
+    assert os.stat(filename).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+def test_reading_does_not_create_the_data_folder(tmp_path):
+    data_dir = str(tmp_path / "data")
+    assert load_store(data_dir) == ([], [])
+    assert not os.path.exists(data_dir)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows only has exclusive locks")
+def test_lock_store_excludes_writers_while_reading(tmp_path):
+    data_dir = str(tmp_path)
+    is_write_locked = threading.Event()
+
+    def write():
+        with lock_store(data_dir):
+            is_write_locked.set()
+
+    with lock_store(data_dir, shared=True):
+        with lock_store(data_dir, shared=True):
+            # Readers do not exclude each other
+            pass
+        writer = threading.Thread(target=write)
+        writer.start()
+        assert not is_write_locked.wait(0.2)
+    assert is_write_locked.wait(5)
+    writer.join()
+
+
+def test_concurrent_syncs_and_group_changes_keep_all_changes(tmp_path):
+    data_dir = str(tmp_path)
+    keys = [f"K{index}" for index in range(20)]
+    update_store([create_annotation(key, "v0") for key in keys], [], data_dir)
+
+    def sync():
+        for version in range(1, 11):
+            update_store(
+                [create_annotation(key, f"v{version}") for key in keys], [], data_dir
+            )
+
+    def change_groups():
+        for key in keys:
+            update_item_groups([key], "group1", True, data_dir)
+
+    threads = [threading.Thread(target=sync), threading.Thread(target=change_groups)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    annotations, _notes = load_store(data_dir)
+    assert all(item["annotationText"] == "v10" for item in annotations)
+    assert all(item["groups"] == ["group1"] for item in annotations)
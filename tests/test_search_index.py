@@ -0,0 +1,77 @@
+from search_index import MAX_EXPANSIONS, SearchIndex
+
+
+def create_search_index(documents):
+    search_index = SearchIndex()
+    for key, text, title, authors in documents:
+        search_index.add_document(key, text, title, authors)
+    return search_index
+
+
+DOCUMENTS = [
+    ("A", "We propose a new architecture", "Attention is all you need", "Vaswani"),
+    ("B", "Training deep neural networks", "Deep Learning", "C"),
+    ("C", "Cats and dogs", "Pets", "Smith"),
+]
+
+
+def test_expand_word_lists_the_exact_word_once():
+    search_index = create_search_index(DOCUMENTS + [("D", "the the", None, None)])
+    assert search_index.expand_word("the") == [("the", 1.0)]
+
+
+def test_expand_word_is_limited():
+    search_index = create_search_index(
+        [(str(index), f"word{index}", None, None) for index in range(50)]
+    )
+    assert len(search_index.expand_word("word")) == MAX_EXPANSIONS
+
+
+def test_typos_of_long_words_match():
+    search_index = create_search_index(DOCUMENTS)
+    assert search_index.find_matching_keys("nueral netwroks") == {"B"}
+    assert search_index.search("atention", 10) == ["A"]
+
+
+def test_all_search_words_must_match():
+    search_index = create_search_index(DOCUMENTS)
+    assert search_index.find_matching_keys("deep dogs") == set()
+    assert search_index.search("deep dogs", 10) == []
+    assert search_index.find_matching_keys("deep learning") == {"B"}
+
+
+def test_short_words_only_match_as_prefix():
+    search_index = create_search_index(DOCUMENTS)
+    # "cat" shares a trigram with the author "C", but is not its prefix
+    assert search_index.find_matching_keys("cat") == {"C"}
+    assert search_index.find_matching_keys("vas") == {"A"}
+    assert search_index.find_matching_keys("dgs") == set()
+
+
+def test_search_ranks_best_matches_first_and_limits_them():
+    search_index = create_search_index(
+        [
+            ("once", "graph and many other words in a long text", None, None),
+            ("twice", "graph graph", None, None),
+            ("title", "other", "Graph", None),
+            ("none", "unrelated", None, None),
+        ]
+    )
+    assert search_index.search("graph", 10) == ["twice", "title", "once"]
+    assert search_index.search("graph", 2) == ["twice", "title"]
+
+
+def test_search_only_scores_allowed_keys():
+    search_index = create_search_index(DOCUMENTS)
+    matching_keys = search_index.find_matching_keys("deep")
+    assert search_index.search("deep", 10, matching_keys) == ["B"]
+    assert search_index.search("deep", 10, {"A"}) == []
+
+
+def test_removed_documents_no_longer_match():
+    search_index = create_search_index(DOCUMENTS)
+    search_index.remove_document("B")
+    search_index.add_document("A", "Deep attention", None, None)
+    assert search_index.find_matching_keys("deep") == {"A"}
+    assert "B" not in search_index
+    assert len(search_index) == 2
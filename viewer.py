@@ -0,0 +1,1506 @@
+import os
+import gi
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from data_store import (
+    add_group,
+    load_collections,
+    load_groups,
+    load_store,
+    normalize_text,
+    update_item_groups,
+)
+from facet_index import (
+    AUTHOR_FACET,
+    COLOR_FACET,
+    GROUP_FACET,
+    TAG_FACET,
+    TYPE_FACET,
+    FacetIndex,
+    intersect_key_sets,
+)
+from search_index import SearchIndex
+from zotero_annotations_exporter import annotations_exporter
+
+gi.require_version("Gtk", "4.0")
+from gi.repository import GLib, Gtk  # noqa: E402
+
+# Interval between two background syncs with the Zotero API
+SYNC_INTERVAL_SECONDS = 15 * 60
+# Interval between two pulses of the sync progress bar while the progress is unknown
+SYNC_PULSE_INTERVAL_MS = 100
+
+# Maximum number of ranked search results that are shown
+SEARCH_RESULT_LIMIT = 500
+# Delay after the last key press before searching
+SEARCH_DELAY_MS = 150
+
+# Sort orders of the listed items ("Default" is the file order or the search ranking)
+DEFAULT_SORT_OPTION = "Default"
+PARENT_SORT_OPTION = "Parent & Page"
+PAGE_SORT_OPTION = "Page"
+COLOR_SORT_OPTION = "Color"
+DATE_MODIFIED_SORT_OPTION = "Date Modified"
+SORT_OPTIONS = [
+    DEFAULT_SORT_OPTION,
+    PARENT_SORT_OPTION,
+    PAGE_SORT_OPTION,
+    COLOR_SORT_OPTION,
+    DATE_MODIFIED_SORT_OPTION,
+]
+
+# Names of Zotero's annotation colors
+COLOR_NAMES = {
+    "#ffd400": "Yellow",
+    "#ff6666": "Red",
+    "#5fb236": "Green",
+    "#2ea8e5": "Blue",
+    "#a28ae5": "Purple",
+    "#e56eee": "Magenta",
+    "#f19837": "Orange",
+    "#aaaaaa": "Gray",
+}
+
+# Key of the search in the sets of item keys allowed by each filter
+SEARCH_FILTER = "Search"
+COLLECTION_FILTER = "Collection"
+
+ROMAN_NUMERAL_PATTERN = re.compile(r"^[ivxlcdm]+$")
+ROMAN_NUMERAL_VALUES = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100, "d": 500, "m": 1000}
+
+
+# Create a group mapping (for easy lookup)
+def create_group_mapping(groups):
+    return {group["key"]: group["name"] for group in groups}
+
+
+# Create an index from each collection key to the keys of the items in it or in any of its subcollections
+def create_collection_index(collections, items):
+    collection_keys_by_name = {}
+    subcollection_keys = {}
+    for collection in collections:
+        collection_keys_by_name.setdefault(collection["name"], []).append(
+            collection["key"]
+        )
+        subcollection_keys.setdefault(collection["parentCollection"], []).append(
+            collection["key"]
+        )
+
+    # Items that are directly in a collection
+    item_keys = {collection["key"]: set() for collection in collections}
+    for item in items:
+        parent_item = item.get("parentItem", {})
+        collection_keys = parent_item.get("collectionKeys")
+        if collection_keys is None:
+            # Data exported before the collection keys were saved only has the names
+            collection_keys = [
+                collection_key
+                for name in parent_item.get("collections", [])
+                for collection_key in collection_keys_by_name.get(name, [])
+            ]
+        for collection_key in collection_keys:
+            if collection_key in item_keys:
+                item_keys[collection_key].add(item["key"])
+
+    # Add the items of all subcollections
+    collection_index = {}
+
+    def collect_item_keys(collection_key):
+        if collection_key not in collection_index:
+            collection_index[collection_key] = item_keys[collection_key]
+            for subcollection_key in subcollection_keys.get(collection_key, []):
+                collection_index[collection_key] |= collect_item_keys(subcollection_key)
+        return collection_index[collection_key]
+
+    for collection_key in item_keys:
+        collect_item_keys(collection_key)
+    return collection_index
+
+
+# Order collections as a tree (for display in the collection filter)
+def get_collection_tree_order(collections):
+    """Return (collection, depth) pairs with each subcollection after its parent, sorted by name."""
+    collection_keys = {collection["key"] for collection in collections}
+    subcollections = {}
+    for collection in collections:
+        parent_key = collection["parentCollection"]
+        if parent_key not in collection_keys:
+            parent_key = None
+        subcollections.setdefault(parent_key, []).append(collection)
+
+    ordered_collections = []
+    stack = [
+        (collection, 0)
+        for collection in sorted(
+            subcollections.get(None, []),
+            key=lambda collection: collection["name"].lower(),
+            reverse=True,
+        )
+    ]
+    while stack:
+        collection, depth = stack.pop()
+        ordered_collections.append((collection, depth))
+        stack.extend(
+            (subcollection, depth + 1)
+            for subcollection in sorted(
+                subcollections.get(collection["key"], []),
+                key=lambda collection: collection["name"].lower(),
+                reverse=True,
+            )
+        )
+    return ordered_collections
+
+
+# Parse a page label into a sort key: roman numerals (front matter) first, then numbers, then other labels
+def parse_page_label(page_label):
+    if not page_label:
+        return (3, 0, "")
+    page_label = page_label.strip().lower()
+    if page_label.isdigit():
+        return (1, int(page_label), "")
+    if ROMAN_NUMERAL_PATTERN.match(page_label):
+        value = 0
+        for numeral, next_numeral in zip(page_label, page_label[1:] + " "):
+            numeral_value = ROMAN_NUMERAL_VALUES[numeral]
+            if numeral_value < ROMAN_NUMERAL_VALUES.get(next_numeral, 0):
+                value -= numeral_value
+            else:
+                value += numeral_value
+        return (0, value, "")
+    # Labels like "12a" or "A-3" are sorted by their first number
+    number_match = re.search(r"\d+", page_label)
+    return (2, int(number_match.group()) if number_match else 0, page_label)
+
+
+# Create the sort key of an item for a sort order
+def create_sort_key(item, sort_option):
+    parent_item = item.get("parentItem", {})
+    # Zotero's annotationSortIndex orders annotations by page and position on the page
+    page_key = (
+        parse_page_label(item.get("annotationPageLabel")),
+        item.get("annotationSortIndex") or "",
+    )
+    if sort_option == PARENT_SORT_OPTION:
+        return (
+            (parent_item.get("title") or "").lower(),
+            parent_item.get("topKey") or parent_item.get("key") or "",
+            page_key,
+        )
+    if sort_option == PAGE_SORT_OPTION:
+        return page_key
+    if sort_option == COLOR_SORT_OPTION:
+        # Items without a color (e.g. notes) come last
+        return (item.get("annotationColor") is None, item.get("annotationColor") or "")
+    if sort_option == DATE_MODIFIED_SORT_OPTION:
+        # Newest first
+        date_modified = item.get("dateModified")
+        if not date_modified:
+            return (1, 0)
+        date_modified = datetime.fromisoformat(date_modified.replace("Z", "+00:00"))
+        return (0, -date_modified.timestamp())
+    raise NotImplementedError("Unknown sort option")
+
+
+# Get the text, title and authors of an annotation or note (for the search index)
+def get_search_fields(item):
+    parent_item = item.get("parentItem", {})
+    text = item["annotationText"] if "annotationText" in item else item.get("note")
+    return item["key"], text, parent_item.get("title"), parent_item.get("authors")
+
+
+# Build a search index in a worker thread
+def build_search_index(documents):
+    search_index = SearchIndex()
+    for key, text, title, authors in documents:
+        search_index.add_document(key, text, title, authors)
+    # Compute the length normalization now, so that the first search does not have to
+    search_index.get_document_norms()
+    return search_index
+
+
+# Add group to annotation or note
+def add_group_to_item(item, group_key):
+    if "groups" not in item:
+        item["groups"] = []
+    if group_key not in item["groups"]:
+        item["groups"].append(group_key)
+
+
+# Apply synced annotations or notes to the loaded ones
+def merge_synced_items(items, synced_items):
+    """Merge synced items into items in place and return the added and the changed items.
+
+    Existing item dicts are updated instead of replaced, so rows keep referencing them,
+    and the locally assigned groups are kept.
+    """
+    items_by_key = {item["key"]: item for item in items}
+    added_items = []
+    changed_items = []
+    for synced_item in synced_items:
+        item = items_by_key.get(synced_item["key"])
+        if item is None:
+            items.append(synced_item)
+            added_items.append(synced_item)
+            continue
+
+        synced_data = {
+            key: value for key, value in synced_item.items() if key != "groups"
+        }
+        current_data = {key: value for key, value in item.items() if key != "groups"}
+        if synced_data != current_data:
+            groups = item.get("groups")
+            item.clear()
+            item.update(synced_data)
+            if groups is not None:
+                item["groups"] = groups
+            changed_items.append(item)
+    return added_items, changed_items
+
+
+class AnnotationNoteManager(Gtk.ApplicationWindow):
+    def __init__(
+        self,
+        application,
+        annotations: list,
+        notes: list,
+        groups: list,
+        collections: list,
+    ):
+        super().__init__(application=application, title="Annotations Viewer")
+        self.set_default_size(800, 600)
+
+        self.annotations = annotations
+        self.notes = notes
+        self.groups = groups
+        self.group_mapping = create_group_mapping(groups)
+        self.collections = collections
+        self.collection_index = create_collection_index(
+            collections, self.annotations + self.notes
+        )
+        self.items_by_key = {
+            item["key"]: item for item in self.annotations + self.notes
+        }
+        self.facet_index = FacetIndex(self.items_by_key.values())
+
+        # The ranked search is available once the search index was built in the background,
+        # until then the search falls back to substring matching
+        self.search_index = None
+        self.search_index_outdated_keys = set()
+        # Incremented for each build, so that only the latest build is used
+        self.search_index_build_count = 0
+        self.search_timeout_id = None
+        # Search text and the keys of all items matching it
+        self.search_key_set_cache = None
+
+        # Sort keys per sort option and item key, computed when a sort option is first used
+        self.sort_key_cache = {}
+        # Rank of each item in the order of a sort option, so that rows are ordered by integers
+        self.sort_rank_cache = {}
+        # Normalized text per item key, computed when duplicates are first collapsed
+        self.duplicate_key_cache = {}
+        self.file_positions = self.get_file_positions()
+
+        # Group changes are saved by one worker thread, in the order they were made,
+        # so that waiting for the store lock does not block the window
+        self.store_write_executor = ThreadPoolExecutor(max_workers=1)
+
+        self.create_widgets()
+        if self.items_by_key:
+            self.start_search_index_build()
+
+    def set_items(self, annotations, notes):
+        """Replace all annotations and notes, e.g. once they were loaded after startup."""
+        self.annotations = annotations
+        self.notes = notes
+        self.collection_index = create_collection_index(
+            self.collections, self.annotations + self.notes
+        )
+        self.items_by_key = {
+            item["key"]: item for item in self.annotations + self.notes
+        }
+        self.facet_index = FacetIndex(self.items_by_key.values())
+        self.search_index = None
+        self.search_index_outdated_keys.clear()
+        self.search_key_set_cache = None
+        self.sort_key_cache = {}
+        self.sort_rank_cache = {}
+        self.duplicate_key_cache = {}
+        self.file_positions = self.get_file_positions()
+
+        self.update_listbox()
+        self.start_search_index_build()
+
+    def get_file_positions(self):
+        """Return the position of each item in the file order (annotations before notes)."""
+        file_positions = {}
+        for list_index, items in enumerate([self.annotations, self.notes]):
+            for item_index, item in enumerate(items):
+                file_positions[item["key"]] = (list_index, item_index)
+        return file_positions
+
+    def create_widgets(self):
+        # Vertical box to hold UI components
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        self.set_child(vbox)
+        vbox.set_margin_top(10)
+        vbox.set_margin_bottom(10)
+        vbox.set_margin_start(10)
+        vbox.set_margin_end(10)
+
+        self.create_filter_widgets(vbox)
+        self.create_facet_filter_widgets(vbox)
+        self.create_item_list_widgets(vbox)
+        self.create_item_group_management_widgets(vbox)
+        self.create_sync_widgets(vbox)
+
+    def create_filter_widgets(self, vbox):
+        # Horizontal box for both group filter and search box
+        filter_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        vbox.append(filter_hbox)
+
+        # Type filter label
+        self.type_filter_label = Gtk.Label(label="Filter by Type:")
+        filter_hbox.append(self.type_filter_label)
+
+        # Type filter dropdown
+        self.type_filter_dropdown = Gtk.DropDown()
+        self.type_filter_strings = Gtk.StringList()
+        self.no_selected_type_filter_text = "All"
+        self.type_filter_strings.append(self.no_selected_type_filter_text)
+        self.annotations_type_filter_text = "Annotations"
+        self.type_filter_strings.append(self.annotations_type_filter_text)
+        self.notes_type_filter_text = "Notes"
+        self.type_filter_strings.append(self.notes_type_filter_text)
+        self.type_filter_dropdown.props.model = self.type_filter_strings
+        # Type of the items in the same order as the dropdown entries
+        self.type_filter_values = [
+            None,
+            self.annotations_type_filter_text,
+            self.notes_type_filter_text,
+        ]
+        self.type_filter_dropdown.connect(
+            "notify::selected-item", self.on_type_filter_changed
+        )
+        self.type_filter_dropdown.set_hexpand(True)
+        filter_hbox.append(self.type_filter_dropdown)
+
+        spacer = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        spacer.set_size_request(20, -1)
+        filter_hbox.append(spacer)
+
+        # Group filter label
+        self.group_filter_label = Gtk.Label(label="Filter by Group:")
+        filter_hbox.append(self.group_filter_label)
+
+        # Group filter dropdown
+        self.group_filter_dropdown = Gtk.DropDown()
+        self.group_filter_strings = Gtk.StringList()
+        self.no_selected_group_filter_text = "All"
+        self.group_filter_strings.append(self.no_selected_group_filter_text)
+        for group in self.groups:
+            self.group_filter_strings.append(group["name"])
+        self.group_filter_dropdown.props.model = self.group_filter_strings
+        self.group_filter_dropdown.connect(
+            "notify::selected-item", self.on_group_filter_changed
+        )
+        self.group_filter_dropdown.set_hexpand(True)
+        filter_hbox.append(self.group_filter_dropdown)
+
+        spacer = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        spacer.set_size_request(20, -1)
+        filter_hbox.append(spacer)
+
+        # Collection filter label
+        self.collection_filter_label = Gtk.Label(label="Filter by Collection:")
+        filter_hbox.append(self.collection_filter_label)
+
+        # Collection filter dropdown (subcollections are indented below their parent)
+        self.collection_filter_dropdown = Gtk.DropDown()
+        self.collection_filter_strings = Gtk.StringList()
+        self.no_selected_collection_filter_text = "All"
+        self.is_updating_collection_filter = False
+        self.set_collection_filter_strings()
+        self.collection_filter_dropdown.props.model = self.collection_filter_strings
+        self.collection_filter_dropdown.connect(
+            "notify::selected-item", self.on_collection_filter_changed
+        )
+        self.collection_filter_dropdown.set_hexpand(True)
+        filter_hbox.append(self.collection_filter_dropdown)
+
+        # Horizontal box for the search box and the duplicates toggle
+        search_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        vbox.append(search_hbox)
+
+        # Search box
+        self.search_entry = Gtk.Entry()
+        self.search_entry.set_placeholder_text("Search...")
+        self.search_entry.connect("changed", self.on_search_changed)
+        self.search_entry.set_hexpand(True)
+        search_hbox.append(self.search_entry)
+
+        # Number of search matches, shown when only the best ones are listed
+        self.search_result_label = Gtk.Label()
+        self.search_result_label.set_visible(False)
+        search_hbox.append(self.search_result_label)
+
+        # Sort order label
+        self.sort_label = Gtk.Label(label="Sort by:")
+        search_hbox.append(self.sort_label)
+
+        # Sort order dropdown
+        self.sort_dropdown = Gtk.DropDown()
+        self.sort_strings = Gtk.StringList()
+        for sort_option in SORT_OPTIONS:
+            self.sort_strings.append(sort_option)
+        self.sort_dropdown.props.model = self.sort_strings
+        # Read by the sort function, which runs for every comparison
+        self.sort_option = DEFAULT_SORT_OPTION
+        self.sort_dropdown.connect("notify::selected-item", self.on_sort_changed)
+        search_hbox.append(self.sort_dropdown)
+
+        # Show items with the same text (e.g. the same highlight in several copies of a PDF) as one row
+        self.collapse_duplicates_check = Gtk.CheckButton(label="Collapse Duplicates")
+        self.collapse_duplicates_check.connect(
+            "toggled", self.on_collapse_duplicates_toggled
+        )
+        search_hbox.append(self.collapse_duplicates_check)
+
+    def create_facet_filter_widgets(self, vbox):
+        # Horizontal box for the color, tag and author filters
+        facet_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        vbox.append(facet_hbox)
+
+        # The entries of the facet filters show the number of items that match the other filters
+        self.facet_filter_dropdowns = {TYPE_FACET: self.type_filter_dropdown}
+        self.facet_filter_strings = {TYPE_FACET: self.type_filter_strings}
+        self.facet_filter_values = {TYPE_FACET: self.type_filter_values}
+        self.facet_filter_labels = {}
+        self.is_updating_facet_filters = False
+
+        for facet, label_text in [
+            (COLOR_FACET, "Filter by Color:"),
+            (TAG_FACET, "Filter by Tag:"),
+            (AUTHOR_FACET, "Filter by Author:"),
+        ]:
+            if facet != COLOR_FACET:
+                spacer = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+                spacer.set_size_request(20, -1)
+                facet_hbox.append(spacer)
+
+            facet_hbox.append(Gtk.Label(label=label_text))
+
+            dropdown = Gtk.DropDown()
+            strings = Gtk.StringList()
+            dropdown.props.model = strings
+            dropdown.connect("notify::selected-item", self.on_facet_filter_changed)
+            dropdown.set_hexpand(True)
+            facet_hbox.append(dropdown)
+            self.facet_filter_dropdowns[facet] = dropdown
+            self.facet_filter_strings[facet] = strings
+            self.facet_filter_values[facet] = [None]
+
+    def get_selected_facet_value(self, facet):
+        """Return the selected value of a facet filter or None if all values are shown."""
+        selected_index = self.facet_filter_dropdowns[facet].props.selected
+        values = self.facet_filter_values[facet]
+        if selected_index >= len(values):
+            return None
+        return values[selected_index]
+
+    def get_facet_value_label(self, facet, value):
+        if facet == COLOR_FACET:
+            return COLOR_NAMES.get(value.lower(), value)
+        return value
+
+    def update_facet_counts(self, key_sets):
+        """Show the number of matching items next to each facet value.
+
+        The counts of a facet take all other filters into account, so they are the
+        intersection of the posting set of each value with the keys allowed by the other filters.
+        """
+        self.is_updating_facet_filters = True
+        for facet, dropdown in self.facet_filter_dropdowns.items():
+            selected_value = self.get_selected_facet_value(facet)
+            other_key_sets = [
+                keys for other_facet, keys in key_sets.items() if other_facet != facet
+            ]
+            counts = self.facet_index.count(facet, intersect_key_sets(other_key_sets))
+
+            if facet == TYPE_FACET:
+                values = self.type_filter_values
+            else:
+                values = [None] + self.facet_index.get_values(facet)
+            labels = [self.no_selected_type_filter_text] + [
+                f"{self.get_facet_value_label(facet, value)} ({counts.get(value, 0)})"
+                for value in values[1:]
+            ]
+
+            if labels != self.facet_filter_labels.get(facet):
+                strings = self.facet_filter_strings[facet]
+                strings.splice(0, strings.get_n_items(), labels)
+                self.facet_filter_values[facet] = values
+                self.facet_filter_labels[facet] = labels
+                dropdown.set_selected(
+                    values.index(selected_value) if selected_value in values else 0
+                )
+        self.is_updating_facet_filters = False
+
+    def on_facet_filter_changed(self, dropdown, _pspec):
+        """Handle the color, tag and author filter change events."""
+        if not self.is_updating_facet_filters:
+            self.update_listbox()
+
+    def get_search_key_set(self, search_text):
+        """Return the keys of all items matching the search text or None if there is no search."""
+        if not search_text.strip():
+            return None
+        if self.search_key_set_cache and self.search_key_set_cache[0] == search_text:
+            return self.search_key_set_cache[1]
+
+        if self.search_index is not None:
+            keys = self.search_index.find_matching_keys(search_text)
+        else:
+            keys = {
+                key
+                for key, item in self.items_by_key.items()
+                if self.search_matches(item, search_text)
+            }
+        self.search_key_set_cache = (search_text, keys)
+        return keys
+
+    def get_filter_key_sets(self):
+        """Return the keys of the items allowed by each filter (None if a filter shows all items)."""
+        _selected_type, selected_group, search_text = self.get_selected_filters()
+
+        key_sets = {}
+        for facet in self.facet_filter_dropdowns:
+            value = self.get_selected_facet_value(facet)
+            key_sets[facet] = (
+                None if value is None else self.facet_index.get_keys(facet, value)
+            )
+
+        group_key = next(
+            (group["key"] for group in self.groups if group["name"] == selected_group),
+            None,
+        )
+        if selected_group == self.no_selected_group_filter_text:
+            key_sets[GROUP_FACET] = None
+        else:
+            key_sets[GROUP_FACET] = self.facet_index.get_keys(GROUP_FACET, group_key)
+
+        key_sets[COLLECTION_FILTER] = self.get_selected_collection_item_keys()
+        key_sets[SEARCH_FILTER] = self.get_search_key_set(search_text)
+        return key_sets
+
+    def create_item_list_widgets(self, vbox):
+        # Create a scrolled window for the listbox to make it scrollable
+        self.scrolled_window = Gtk.ScrolledWindow()
+        self.scrolled_window.set_policy(
+            Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.ALWAYS
+        )  # Vertical scroll, horizontal is automatic
+        vbox.append(self.scrolled_window)
+
+        # ListBox to display items (annotations and notes)
+        self.listbox = Gtk.ListBox()
+        self.listbox.set_vexpand(True)
+        # Rows are inserted at their sort position, so the listbox needs no sort function
+        self.scrolled_window.set_child(self.listbox)
+
+        # Update the listbox with data
+        self.update_listbox()
+
+    def create_item_group_management_widgets(self, vbox):
+        # Add controls below the listbox
+        controls_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        controls_hbox.set_homogeneous(False)
+        vbox.append(controls_hbox)
+
+        # Group selection dropdown
+        self.group_item_dropdown = Gtk.DropDown()
+        self.group_item_strings = Gtk.StringList()
+        self.no_selected_group_item_text = "Select Group"
+        self.group_item_strings.append(self.no_selected_group_item_text)
+        for group in self.groups:
+            self.group_item_strings.append(group["name"])
+        self.group_item_dropdown.props.model = self.group_item_strings
+        self.group_item_dropdown.connect(
+            "notify::selected-item",
+            self.on_group_item_changed,
+        )
+        controls_hbox.append(self.group_item_dropdown)
+        self.group_item_dropdown.set_hexpand(True)
+
+        # Button to add selected item to a group
+        self.add_to_group_button = Gtk.Button(label="Add to Group")
+        self.add_to_group_button.connect("clicked", self.on_add_to_group_clicked)
+        controls_hbox.append(self.add_to_group_button)
+
+        # Button to remove selected item from a group
+        self.remove_from_group_button = Gtk.Button(label="Remove from Group")
+        self.remove_from_group_button.connect(
+            "clicked", self.on_remove_from_group_clicked
+        )
+        controls_hbox.append(self.remove_from_group_button)
+
+        self.set_group_item_button_states()
+
+        separator = Gtk.Separator()
+        separator.set_orientation(Gtk.Orientation.VERTICAL)
+        controls_hbox.append(separator)
+
+        # Button to create a new group
+        self.new_group_button = Gtk.Button(label="Create New Group")
+        self.new_group_button.connect("clicked", self.on_create_new_group_clicked)
+        controls_hbox.append(self.new_group_button)
+
+    def create_sync_widgets(self, vbox):
+        # Status bar showing the progress of the background sync
+        sync_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        vbox.append(sync_hbox)
+
+        self.sync_progress_bar = Gtk.ProgressBar()
+        self.sync_progress_bar.set_show_text(True)
+        self.sync_progress_bar.set_hexpand(True)
+        self.sync_progress_bar.set_valign(Gtk.Align.CENTER)
+        self.sync_progress_bar.set_visible(False)
+        sync_hbox.append(self.sync_progress_bar)
+
+        self.sync_pulse_timeout_id = None
+
+        self.sync_status_label = Gtk.Label(xalign=0)
+        self.sync_status_label.set_hexpand(True)
+        sync_hbox.append(self.sync_status_label)
+
+        # Button to sync with the Zotero API on demand
+        self.sync_button = Gtk.Button(label="Sync Now")
+        self.sync_button.connect("clicked", self.on_sync_clicked)
+        sync_hbox.append(self.sync_button)
+
+    def on_sync_clicked(self, button):
+        """Start a background sync with the Zotero API."""
+        if not self.get_application().sync_service.sync():
+            self.sync_status_label.set_text(
+                "Sync unavailable: run 'python main.py update' once to configure .env"
+            )
+
+    def on_sync_started(self):
+        """Show the progress bar while a sync is running."""
+        self.sync_button.set_sensitive(False)
+        self.sync_status_label.set_visible(False)
+        self.sync_progress_bar.set_fraction(0)
+        self.sync_progress_bar.set_text("Syncing...")
+        self.sync_progress_bar.set_visible(True)
+        # The progress bar pulses during the phases of the sync without a known progress
+        self.is_sync_progress_unknown = True
+        self.sync_pulse_timeout_id = GLib.timeout_add(
+            SYNC_PULSE_INTERVAL_MS, self.on_sync_pulse_timeout
+        )
+
+    def on_sync_pulse_timeout(self):
+        if self.is_sync_progress_unknown:
+            self.sync_progress_bar.pulse()
+        return GLib.SOURCE_CONTINUE
+
+    def on_sync_progress(self, message, fraction):
+        """Update the progress bar with the current phase of the sync."""
+        self.is_sync_progress_unknown = fraction is None
+        if fraction is not None:
+            self.sync_progress_bar.set_fraction(min(fraction, 1))
+        self.sync_progress_bar.set_text(f"Syncing: {message}")
+
+    def on_sync_finished(self, status_text):
+        """Hide the progress bar and show the result of the sync."""
+        if self.sync_pulse_timeout_id is not None:
+            GLib.source_remove(self.sync_pulse_timeout_id)
+            self.sync_pulse_timeout_id = None
+        self.sync_button.set_sensitive(True)
+        self.sync_progress_bar.set_visible(False)
+        self.sync_status_label.set_text(status_text)
+        self.sync_status_label.set_visible(True)
+
+    def set_collection_filter_strings(self):
+        """Fill the collection filter with the collection tree."""
+        # Keys of the collections in the same order as the dropdown entries
+        self.collection_filter_keys = [None]
+        collection_names = [self.no_selected_collection_filter_text]
+        for collection, depth in get_collection_tree_order(self.collections):
+            self.collection_filter_keys.append(collection["key"])
+            collection_names.append("    " * depth + collection["name"])
+        self.collection_filter_strings.splice(
+            0, self.collection_filter_strings.get_n_items(), collection_names
+        )
+
+    def update_collections(self, collections):
+        """Replace the collection tree and rebuild the collection index."""
+        selected_collection_key = self.get_selected_collection_key()
+        if collections != self.collections:
+            self.collections = collections
+            self.is_updating_collection_filter = True
+            self.set_collection_filter_strings()
+            if selected_collection_key in self.collection_filter_keys:
+                self.collection_filter_dropdown.set_selected(
+                    self.collection_filter_keys.index(selected_collection_key)
+                )
+            self.is_updating_collection_filter = False
+        self.collection_index = create_collection_index(
+            self.collections, self.annotations + self.notes
+        )
+        if selected_collection_key != self.get_selected_collection_key():
+            self.update_listbox()
+
+    def get_selected_collection_key(self):
+        """Return the key of the selected collection or None if all collections are shown."""
+        selected_index = self.collection_filter_dropdown.props.selected
+        if selected_index >= len(self.collection_filter_keys):
+            return None
+        return self.collection_filter_keys[selected_index]
+
+    def get_selected_collection_item_keys(self):
+        """Return the keys of the items in the selected collection or None if all collections are shown."""
+        collection_key = self.get_selected_collection_key()
+        if collection_key is None:
+            return None
+        return self.collection_index.get(collection_key, set())
+
+    def get_group_names_from_keys(self, group_keys):
+        """Given a list of group keys, return the corresponding group names."""
+        group_names = []
+        for key in group_keys:
+            group = next((group for group in self.groups if group["key"] == key), None)
+            if group:
+                group_names.append(group["name"])
+        return ", ".join(group_names) if group_names else ""
+
+    def get_items_of_type(self, selected_type):
+        """Get all items of the selected type."""
+        if selected_type == self.no_selected_type_filter_text:
+            return self.annotations + self.notes
+        if selected_type == self.annotations_type_filter_text:
+            return self.annotations
+        elif selected_type == self.notes_type_filter_text:
+            return self.notes
+        else:
+            raise NotImplementedError("Unknown item type")
+
+    def on_filter_changed(self, widget):
+        """Callback when the group filter changes."""
+        self.update_listbox()
+
+    def on_search_changed(self, widget):
+        """Callback when the search box changes."""
+        # Only search once the user stopped typing
+        if self.search_timeout_id is not None:
+            GLib.source_remove(self.search_timeout_id)
+        self.search_timeout_id = GLib.timeout_add(
+            SEARCH_DELAY_MS, self.on_search_timeout
+        )
+
+    def on_search_timeout(self):
+        self.search_timeout_id = None
+        self.update_listbox()
+        return GLib.SOURCE_REMOVE
+
+    def start_search_index_build(self):
+        """Build the search index in a worker thread."""
+        documents = [get_search_fields(item) for item in self.items_by_key.values()]
+        self.search_index_build_count += 1
+        build_count = self.search_index_build_count
+
+        def build():
+            search_index = build_search_index(documents)
+            GLib.idle_add(self.on_search_index_built, search_index, build_count)
+
+        thread = threading.Thread(target=build, daemon=True)
+        thread.start()
+
+    def on_search_index_built(self, search_index, build_count):
+        """Use the built search index and add the items that were synced in the meantime."""
+        if build_count != self.search_index_build_count:
+            return GLib.SOURCE_REMOVE
+        for key in self.search_index_outdated_keys:
+            search_index.add_document(*get_search_fields(self.items_by_key[key]))
+        self.search_index_outdated_keys.clear()
+        self.search_index = search_index
+        self.search_key_set_cache = None
+
+        if self.search_entry.get_text().strip():
+            self.update_listbox()
+        return GLib.SOURCE_REMOVE
+
+    def update_search_index(self, items):
+        """Add or replace items in the search index."""
+        for item in items:
+            if self.search_index is None:
+                self.search_index_outdated_keys.add(item["key"])
+            else:
+                self.search_index.add_document(*get_search_fields(item))
+
+    def get_selected_filters(self):
+        """Return the currently selected type, group and search text."""
+        selected_type = (
+            self.get_selected_facet_value(TYPE_FACET)
+            or self.no_selected_type_filter_text
+        )
+        selected_group = self.group_filter_dropdown.props.selected_item.props.string
+        search_text = self.search_entry.get_text().lower()  # Case-insensitive search
+        return selected_type, selected_group, search_text
+
+    def item_matches_filters(self, item, key_sets=None):
+        """Check if a single item passes all filters and the search."""
+        if key_sets is None:
+            key_sets = self.get_filter_key_sets()
+        return all(keys is None or item["key"] in keys for keys in key_sets.values())
+
+    def update_listbox(self):
+        """Update the listbox with annotations and notes based on filters and search."""
+        self.listbox.remove_all()  # Clear the current listbox items
+        self.rows_by_key = {}
+        # Rows in listbox order and their sort positions, to find where synced rows go
+        self.rows = []
+        self.row_positions = []
+        self.duplicates_by_key = {}
+
+        filtered_items = []
+
+        selected_type, _selected_group, search_text = self.get_selected_filters()
+
+        key_sets = self.get_filter_key_sets()
+        self.update_facet_counts(key_sets)
+
+        # Filter by type, group, collection, color, tag and author by intersecting the precomputed key sets
+        allowed_keys = intersect_key_sets(
+            keys for name, keys in key_sets.items() if name != SEARCH_FILTER
+        )
+
+        # Further filter by search term
+        search_ranks = {}
+        self.search_result_label.set_visible(False)
+        if search_text.strip() and self.search_index is not None:
+            # Rank the matching items and keep only the best ones,
+            # scoring only the matches that were already found for the filter counts
+            matching_keys = intersect_key_sets([allowed_keys, key_sets[SEARCH_FILTER]])
+            result_keys = self.search_index.search(
+                search_text, SEARCH_RESULT_LIMIT, matching_keys
+            )
+            filtered_items = [self.items_by_key[key] for key in result_keys]
+            search_ranks = {key: rank for rank, key in enumerate(result_keys)}
+
+            # The filter counts include all matches, so the number of matches is shown if some are not listed
+            match_count = len(matching_keys)
+            if match_count > len(result_keys):
+                self.search_result_label.set_text(
+                    f"Best {len(result_keys)} of {match_count} matches"
+                )
+                self.search_result_label.set_visible(True)
+        else:
+            allowed_keys = intersect_key_sets([allowed_keys, key_sets[SEARCH_FILTER]])
+            filtered_items = [
+                item
+                for item in self.get_items_of_type(selected_type)
+                if allowed_keys is None or item["key"] in allowed_keys
+            ]
+
+        # Collapse items with the same text into the row of the first one
+        if self.collapse_duplicates_check.get_active():
+            first_items_by_text = {}
+            unique_items = []
+            for item in filtered_items:
+                duplicate_key = self.get_duplicate_key(item)
+                first_item = first_items_by_text.get(duplicate_key)
+                if first_item is None:
+                    if duplicate_key:
+                        first_items_by_text[duplicate_key] = item
+                        self.duplicates_by_key[item["key"]] = [item]
+                    unique_items.append(item)
+                else:
+                    self.duplicates_by_key[first_item["key"]].append(item)
+            filtered_items = unique_items
+
+        # Add filtered items to the ListBox, sorted once instead of row by row
+        positioned_items = []
+        for item in filtered_items:
+            search_rank = search_ranks.get(item["key"], 0)
+            positioned_items.append(
+                (self.get_row_position(item, search_rank), search_rank, item)
+            )
+        positioned_items.sort(key=lambda positioned_item: positioned_item[0])
+        for position, search_rank, item in positioned_items:
+            self.insert_row(item, search_rank, position)
+
+    def insert_row(self, item, search_rank=0, position=None):
+        """Create a row for the item and insert it into the listbox at its sort position."""
+        if position is None:
+            position = self.get_row_position(item, search_rank)
+        row = Gtk.ListBoxRow()
+        row.data = item
+        row.search_rank = search_rank
+        row.position = position
+        row.set_margin_top(4)
+        row.set_margin_bottom(4)
+        row.set_child(
+            self.create_row_label(
+                item, len(self.duplicates_by_key.get(item["key"], []))
+            )
+        )
+        index = bisect_right(self.row_positions, position)
+        if index == len(self.rows):
+            self.listbox.append(row)
+        else:
+            self.listbox.insert(row, index)
+        self.rows.insert(index, row)
+        self.row_positions.insert(index, position)
+        self.rows_by_key[item["key"]] = row
+
+    def remove_row(self, row):
+        """Remove a row from the listbox."""
+        index = bisect_left(self.row_positions, row.position)
+        del self.rows[index]
+        del self.row_positions[index]
+        del self.rows_by_key[row.data["key"]]
+        self.listbox.remove(row)
+
+    def get_duplicate_key(self, item):
+        """Return the cached normalized text of an item, which is equal for near-identical texts."""
+        duplicate_key = self.duplicate_key_cache.get(item["key"])
+        if duplicate_key is None:
+            text = (
+                item["annotationText"] if "annotationText" in item else item.get("note")
+            )
+            duplicate_key = self.duplicate_key_cache[item["key"]] = normalize_text(
+                text or ""
+            )
+        return duplicate_key
+
+    def get_sort_key(self, item, sort_option):
+        """Return the cached sort key of an item."""
+        sort_keys = self.sort_key_cache.setdefault(sort_option, {})
+        sort_key = sort_keys.get(item["key"])
+        if sort_key is None:
+            sort_key = sort_keys[item["key"]] = create_sort_key(item, sort_option)
+        return sort_key
+
+    def get_sort_ranks(self, sort_option):
+        """Return the cached rank of each item in the order of a sort option (equal sort keys share a rank)."""
+        sort_ranks = self.sort_rank_cache.get(sort_option)
+        if sort_ranks is None:
+            sort_keys = {
+                key: self.get_sort_key(item, sort_option)
+                for key, item in self.items_by_key.items()
+            }
+            sort_ranks = self.sort_rank_cache[sort_option] = {}
+            rank = -1
+            previous_sort_key = None
+            for key in sorted(sort_keys, key=sort_keys.__getitem__):
+                if rank < 0 or sort_keys[key] != previous_sort_key:
+                    rank += 1
+                    previous_sort_key = sort_keys[key]
+                sort_ranks[key] = rank
+        return sort_ranks
+
+    def get_row_position(self, item, search_rank=0):
+        """Return the sort position of a row: by the selected sort order, then by search rank and file order."""
+        list_index, item_index = self.file_positions[item["key"]]
+        if self.sort_option == DEFAULT_SORT_OPTION:
+            return (search_rank, list_index, item_index)
+        sort_rank = self.get_sort_ranks(self.sort_option)[item["key"]]
+        return (sort_rank, search_rank, list_index, item_index)
+
+    def on_sort_changed(self, dropdown, _pspec):
+        """Handle the sort order change event."""
+        self.sort_option = dropdown.props.selected_item.props.string
+        self.update_listbox_keeping_scroll_position()
+
+    def get_row_items(self, row):
+        """Return the items shown in a row (several if duplicates are collapsed)."""
+        return self.duplicates_by_key.get(row.data["key"], [row.data])
+
+    def create_row_label(self, item, duplicate_count=1):
+        """Create the label displaying an annotation or note."""
+        if "annotationText" in item:
+            display_text = (
+                item["annotationText"].strip() if item["annotationText"] else ""
+            )
+            type = "A"
+        else:
+            display_text = item["note"].strip()
+            type = "N"
+
+        page_label_string = ""
+        if "annotationPageLabel" in item:
+            page_label_string = f", p. {item['annotationPageLabel']}"
+        parent_title = item["parentItem"]["title"] if "parentItem" in item else "N/A"
+        parent_authors = item["parentItem"]["authors"] if "parentItem" in item else ""
+
+        # Retrieve group names from the group keys in 'groups'
+        group_names = self.get_group_names_from_keys(item.get("groups", []))
+
+        def escape_markup(text):
+            # Replace < and > with their HTML entities
+            text = text.replace("<", "&lt;").replace(">", "&gt;")
+            return text
+
+        display_text = escape_markup(display_text)
+        parent_title = escape_markup(parent_title)
+        parent_authors = escape_markup(parent_authors)
+        if parent_authors:
+            parent_string = f"{parent_title} ({parent_authors}){page_label_string}"
+        else:
+            parent_string = f"{parent_title}{page_label_string}"
+
+        duplicate_string = f" ×{duplicate_count}" if duplicate_count > 1 else ""
+
+        label = Gtk.Label(xalign=0)
+        label.set_markup(
+            f"<b>{display_text}</b>\n{parent_string}\n[{type}]{duplicate_string} {group_names}"
+        )
+        label.set_property("wrap", True)  # Enable line wrapping
+        label.set_max_width_chars(70)  # Adjust the maximum width of the text
+        return label
+
+    def apply_synced_items(self, added_items, changed_items):
+        """Update only the rows of synced items, keeping filters, search, selection and scroll position."""
+        for item in added_items:
+            self.items_by_key[item["key"]] = item
+        for item in added_items + changed_items:
+            self.facet_index.add_item(item)
+        self.update_search_index(added_items + changed_items)
+        self.search_key_set_cache = None
+        for sort_keys in self.sort_key_cache.values():
+            for item in changed_items:
+                sort_keys.pop(item["key"], None)
+        for item in changed_items:
+            self.duplicate_key_cache.pop(item["key"], None)
+        if added_items or changed_items:
+            self.sort_rank_cache = {}
+        if added_items:
+            self.file_positions = self.get_file_positions()
+
+        if self.collapse_duplicates_check.get_active():
+            # Synced items may join or leave collapsed rows, so the rows are rebuilt
+            if added_items or changed_items:
+                self.update_listbox_keeping_scroll_position()
+            return
+
+        key_sets = self.get_filter_key_sets()
+        self.update_facet_counts(key_sets)
+
+        # Rows of new items are sorted in after all ranked search results
+        search_rank = SEARCH_RESULT_LIMIT if self.search_entry.get_text().strip() else 0
+        inserted_items = [(item, search_rank) for item in added_items]
+        for item in changed_items:
+            row = self.rows_by_key.get(item["key"])
+            matches = self.item_matches_filters(item, key_sets)
+            if row:
+                # The row is inserted again, as its sort position may have changed
+                self.remove_row(row)
+                if matches:
+                    inserted_items.append((item, row.search_rank))
+            elif matches:
+                inserted_items.append((item, search_rank))
+
+        # The ranks of the other rows may have shifted, but not their order
+        for index, row in enumerate(self.rows):
+            row.position = self.row_positions[index] = self.get_row_position(
+                row.data, row.search_rank
+            )
+
+        for item, item_search_rank in inserted_items:
+            if item["key"] in self.rows_by_key or not self.item_matches_filters(
+                item, key_sets
+            ):
+                continue
+            self.insert_row(item, item_search_rank)
+
+    def update_listbox_keeping_scroll_position(self):
+        """Rebuild the listbox and scroll back to the previous position."""
+        vadjustment = self.scrolled_window.get_vadjustment()
+        scroll_position = vadjustment.get_value()
+        self.update_listbox()
+
+        def restore_scroll_position():
+            vadjustment.set_value(scroll_position)
+            return GLib.SOURCE_REMOVE
+
+        # The new rows are only allocated once the listbox was laid out again
+        GLib.idle_add(restore_scroll_position)
+
+    def on_collapse_duplicates_toggled(self, check_button):
+        """Handle the collapse duplicates toggle event."""
+        self.update_listbox()
+
+    def search_matches(self, item, search_text):
+        """Check if the item matches the search text in parent_title, parent_authors, or display_text."""
+        parent_title = item["parentItem"]["title"] if "parentItem" in item else ""
+        parent_authors = item["parentItem"]["authors"] if "parentItem" in item else ""
+        display_text = (
+            item["annotationText"] if "annotationText" in item else item.get("note", "")
+        )
+        if display_text is None:
+            display_text = ""
+
+        # Check if any of the fields contain the search text
+        return (
+            search_text in parent_title.lower()
+            or search_text in parent_authors.lower()
+            or search_text in display_text.lower()
+        )
+
+    def on_type_filter_changed(self, dropdown, _pspec):
+        """Handle the type filter change event."""
+        if not self.is_updating_facet_filters:
+            self.update_listbox()
+
+    def on_group_filter_changed(self, dropdown, _pspec):
+        """Handle the group filter change event."""
+        self.update_listbox()
+
+    def on_collection_filter_changed(self, dropdown, _pspec):
+        """Handle the collection filter change event."""
+        if not self.is_updating_collection_filter:
+            self.update_listbox()
+
+    def set_group_item_button_states(self):
+        selected_group = self.group_item_dropdown.props.selected_item.props.string
+        if selected_group == self.no_selected_group_item_text:
+            self.add_to_group_button.set_sensitive(False)
+            self.remove_from_group_button.set_sensitive(False)
+        else:
+            self.add_to_group_button.set_sensitive(True)
+            self.remove_from_group_button.set_sensitive(True)
+
+    def on_group_item_changed(self, dropdown, _pspec):
+        """Handle the group item selection change event."""
+        self.set_group_item_button_states()
+
+    def on_add_to_group_clicked(self, button):
+        """Add the selected item to the selected group."""
+        selected_item_row = self.listbox.get_selected_row()
+
+        if selected_item_row:
+            # Get the selected group from the dropdown
+            selected_group = self.group_item_dropdown.props.selected_item.props.string
+            group_key = None
+            for group in self.groups:
+                if group["name"] == selected_group:
+                    group_key = group["key"]
+                    break
+
+            if group_key:
+                # Add the group key to the item (annotations or notes) and its collapsed duplicates
+                item_keys = [
+                    item["key"] for item in self.get_row_items(selected_item_row)
+                ]
+                for item_key in item_keys:
+                    item = self.items_by_key[item_key]
+                    add_group_to_item(item, group_key)
+                    self.facet_index.add_item(item)
+
+                # Save the change merged into the stored item groups
+                self.save_in_background(update_item_groups, item_keys, group_key, True)
+
+                # Update the listbox to reflect the change
+                self.update_listbox()
+            else:
+                popover = Gtk.Popover()
+                popover.set_child(
+                    Gtk.Label(label="Error: Selected Group was not found!")
+                )
+                popover.set_parent(self.add_to_group_button)
+                popover.popup()
+        else:
+            popover = Gtk.Popover()
+            popover.set_child(Gtk.Label(label="Error: Select an item first!"))
+            popover.set_parent(self.add_to_group_button)
+            popover.popup()
+
+    def on_remove_from_group_clicked(self, button):
+        """Remove the selected item from the selected group."""
+        selected_item_row = self.listbox.get_selected_row()
+
+        if selected_item_row:
+            # Get the selected items (the annotation or note and its collapsed duplicates)
+            selected_items = self.get_row_items(selected_item_row)
+
+            # Get the selected group name from the combo box
+            selected_group = self.group_item_dropdown.props.selected_item.props.string
+
+            if selected_group != "Select Group":
+                # Find the group key using the selected group name
+                group_key = next(
+                    group["key"]
+                    for group in self.groups
+                    if group["name"] == selected_group
+                )
+                print(
+                    f"Removing selected item from group: {selected_group} (group key: {group_key})"
+                )
+
+                # Remove the group key from the selected items' 'groups' lists
+                removed_from_group = False
+                for selected_item in selected_items:
+                    if group_key in selected_item.get("groups", []):
+                        selected_item["groups"].remove(group_key)
+                        self.facet_index.add_item(selected_item)
+                        removed_from_group = True
+
+                if removed_from_group:
+                    # Save the change merged into the stored item groups
+                    self.save_in_background(
+                        update_item_groups,
+                        [selected_item["key"] for selected_item in selected_items],
+                        group_key,
+                        False,
+                    )
+
+                    # Refresh the listbox after removing the group
+                    self.update_listbox()
+
+        else:
+            popover = Gtk.Popover()
+            popover.set_child(Gtk.Label(label="Error: Select an item first!"))
+            popover.set_parent(self.remove_from_group_button)
+            popover.popup()
+
+    def on_create_new_group_clicked(self, button):
+        """Create a new group by asking for user input."""
+
+        def on_ok_button_clicked(button):
+            new_group_name = entry.get_text()
+            if new_group_name:
+                # Save the new group, merged with groups created by other instances
+                self.save_in_background(
+                    add_group, new_group_name, on_saved=self.on_groups_saved
+                )
+
+            dialog.close()
+
+        dialog = Gtk.Dialog(title="Create New Group", transient_for=self)
+        content_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
+        content_box.set_margin_top(10)
+        content_box.set_margin_start(10)
+        content_box.set_margin_end(10)
+
+        # Add a text entry to input the new group name
+        entry = Gtk.Entry()
+        entry.set_placeholder_text("Group Name")
+        content_box.append(entry)
+        dialog.get_child().append(content_box)
+
+        # Create a box for the buttons at the bottom
+        button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        button_box.set_margin_top(10)
+        button_box.set_margin_bottom(10)
+        button_box.set_halign(Gtk.Align.CENTER)
+        dialog.get_child().append(button_box)
+
+        # Create the Cancel button
+        cancel_button = Gtk.Button(label="Cancel")
+        cancel_button.connect("clicked", lambda button: dialog.close())
+        button_box.append(cancel_button)
+
+        # Create the OK button
+        ok_button = Gtk.Button(label="OK")
+        ok_button.connect("clicked", on_ok_button_clicked)
+        button_box.append(ok_button)
+
+        dialog.set_default_size(300, 100)
+        dialog.present()
+
+    def on_groups_saved(self, groups):
+        """Show the groups saved together with a new group."""
+        new_groups = groups[len(self.groups) :]
+        # The group list is shared with the application, so it is updated in place
+        self.groups[:] = groups
+        self.group_mapping = create_group_mapping(groups)
+
+        # Update group filter and group combo boxes
+        for new_group in new_groups:
+            self.group_filter_strings.append(new_group["name"])
+            self.group_item_strings.append(new_group["name"])
+
+        # Update the listbox
+        self.update_listbox()
+
+    def save_in_background(self, save_function, *args, on_saved=None):
+        """Call a function saving to the data store in the worker thread.
+
+        If given, on_saved is called in the main thread with the result.
+        """
+
+        def save():
+            try:
+                result = save_function(*args)
+            except Exception as e:
+                print(f"Saving failed: {e}")
+                GLib.idle_add(self.on_save_failed, str(e))
+                return
+            if on_saved:
+                GLib.idle_add(self.call_once, on_saved, result)
+
+        self.store_write_executor.submit(save)
+
+    def call_once(self, function, *args):
+        function(*args)
+        return GLib.SOURCE_REMOVE
+
+    def on_save_failed(self, error_text):
+        self.sync_status_label.set_text(f"Saving the groups failed: {error_text}")
+        self.sync_status_label.set_visible(True)
+        return GLib.SOURCE_REMOVE
+
+
+class SyncService:
+    """Run the exporter in a worker thread, periodically or on demand."""
+
+    def __init__(self, application, interval_seconds=SYNC_INTERVAL_SECONDS):
+        self.application = application
+        self.interval_seconds = interval_seconds
+        self.is_running = False
+        self.timeout_id = None
+
+    def start(self):
+        """Start syncing periodically."""
+        if self.timeout_id is None:
+            self.timeout_id = GLib.timeout_add_seconds(
+                self.interval_seconds, self.on_timeout
+            )
+
+    def stop(self):
+        """Stop syncing periodically."""
+        if self.timeout_id is not None:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+
+    def on_timeout(self):
+        self.sync()
+        return GLib.SOURCE_CONTINUE
+
+    def sync(self):
+        """Start a sync unless one is already running. Returns False if no sync was started."""
+        if self.is_running:
+            return False
+        # Without a .env file the exporter would ask for the credentials on the terminal
+        if not os.path.exists(".env"):
+            return False
+
+        self.is_running = True
+        self.application.on_sync_started()
+        thread = threading.Thread(target=self.run_exporter, daemon=True)
+        thread.start()
+        return True
+
+    def run_exporter(self):
+        """Run the exporter and load its results (runs in the worker thread)."""
+        annotations = None
+        notes = None
+        collections = None
+        try:
+            exit_code = annotations_exporter(progress_callback=self.report_progress)
+            if exit_code == 0:
+                self.report_progress("Loading synced items...", None)
+                annotations, notes = load_store()
+                collections = load_collections()
+        except Exception as e:
+            print(f"Sync failed: {e}")
+            exit_code = 1
+        GLib.idle_add(self.finish, exit_code, annotations, notes, collections)
+
+    def report_progress(self, message, fraction):
+        # Widgets may only be changed from the main thread
+        GLib.idle_add(self.application.on_sync_progress, message, fraction)
+
+    def finish(self, exit_code, annotations, notes, collections):
+        self.is_running = False
+        self.application.on_sync_finished(exit_code, annotations, notes, collections)
+        return GLib.SOURCE_REMOVE
+
+
+class Application(Gtk.Application):
+    def __init__(self, launch_time=None, quit_after_launch=False):
+        super().__init__(application_id="org.palask.AnnotationsViewer")
+        # The annotations and notes are loaded after the window was shown for the first time
+        self.annotations = []
+        self.notes = []
+        self.groups = load_groups()
+        self.collections = load_collections()
+        self.window = None
+        self.sync_service = SyncService(self)
+        self.launch_time = launch_time
+        self.quit_after_launch = quit_after_launch
+
+    def do_activate(self):
+        # Create and show the window when the application is activated
+        if self.window is None:
+            self.window = AnnotationNoteManager(
+                self, self.annotations, self.notes, self.groups, self.collections
+            )
+            if self.launch_time is not None:
+                self.window.connect("map", self.on_window_mapped)
+            # Idle callbacks run after the window was drawn
+            GLib.idle_add(self.load_items)
+        self.window.set_visible(True)
+
+    def load_items(self):
+        """Load the annotations and notes and show them in the window."""
+        self.annotations, self.notes = load_store()
+        self.window.set_items(self.annotations, self.notes)
+        self.report_launch_time("Items shown")
+        if self.quit_after_launch:
+            self.quit()
+        else:
+            self.sync_service.start()
+        return GLib.SOURCE_REMOVE
+
+    def on_window_mapped(self, window):
+        frame_clock = window.get_frame_clock()
+        handler_id = None
+
+        def on_after_paint(frame_clock):
+            frame_clock.disconnect(handler_id)
+            self.report_launch_time("First frame painted")
+
+        handler_id = frame_clock.connect("after-paint", on_after_paint)
+
+    def report_launch_time(self, event):
+        """Print the time since the launch if launch timing is enabled."""
+        if self.launch_time is not None:
+            elapsed_ms = (time.perf_counter() - self.launch_time) * 1000
+            print(f"{event} after {elapsed_ms:.1f} ms")
+
+    def on_sync_started(self):
+        if self.window:
+            self.window.on_sync_started()
+
+    def on_sync_progress(self, message, fraction):
+        if self.window:
+            self.window.on_sync_progress(message, fraction)
+        return GLib.SOURCE_REMOVE
+
+    def on_sync_finished(self, exit_code, annotations, notes, collections):
+        """Apply the synced data to the loaded data and the open window."""
+        if exit_code != 0 or annotations is None or notes is None:
+            status_text = "Sync failed. Please check your .env"
+            added_items = []
+            changed_items = []
+        else:
+            added_annotations, changed_annotations = merge_synced_items(
+                self.annotations, annotations
+            )
+            added_notes, changed_notes = merge_synced_items(self.notes, notes)
+            added_items = added_annotations + added_notes
+            changed_items = changed_annotations + changed_notes
+            status_text = (
+                f"Synced: {len(added_items)} new, {len(changed_items)} changed"
+            )
+            self.collections = collections
+            if self.window:
+                self.window.update_collections(self.collections)
+
+        if self.window:
+            self.window.apply_synced_items(added_items, changed_items)
+            self.window.on_sync_finished(status_text)
@@ -1,10 +1,11 @@
 import os
-import urllib.request
-import urllib.parse
+from urllib.parse import urlencode
 import json
 import re
 from html import unescape
 
+from data_store import load_collections, save_collections, update_store
+
 
 def create_env_file(filepath=".env"):
     """Create a .env file by asking the user for the necessary environment variables."""
@@ -98,15 +99,22 @@ def is_env_file_invalid(filepath=".env") -> bool:
     return is_invalid
 
 
-def fetch_items(base_url, api_key):
-    """Function to fetch Zotero items (metadata + annotations) from the API"""
+def fetch_items(base_url, api_key, progress_callback=None):
+    """Function to fetch Zotero items (metadata + annotations) from the API
+
+    Returns the fetched items and whether all pages were fetched. If given, progress_callback is called with the number of fetched items and
+    the total number of items reported by the API (or None if unknown) after each page.
+    """
+    # Imported here as it is slow to import and the viewer only needs it when syncing
+    from urllib import error, request
+
     print(f"Starting querying Zotero API for {base_url}")
     items = []
     url = "https://api.zotero.org/" + base_url
     params = {
         "format": "json",
     }
-    query_string = urllib.parse.urlencode(params)
+    query_string = urlencode(params)
 
     while url:
         if query_string:
@@ -116,14 +124,19 @@ def fetch_items(base_url, api_key):
                 full_url = f"{url}?{query_string}"
         else:
             full_url = url
-        req = urllib.request.Request(full_url, headers={"Zotero-API-Key": api_key})
+        req = request.Request(full_url, headers={"Zotero-API-Key": api_key})
         print(f"\tQuerying {full_url}")
 
         try:
             # Make the request
-            with urllib.request.urlopen(req) as response:
+            with request.urlopen(req) as response:
                 if response.status == 200:
                     items += json.load(response)
+                    if progress_callback:
+                        total_results = response.headers.get("Total-Results")
+                        progress_callback(
+                            len(items), int(total_results) if total_results else None
+                        )
                     # If there are more pages, the response will contain a 'link' to the next page
                     link_header = response.headers.get("Link", "")
                     url = None
@@ -142,12 +155,13 @@ def fetch_items(base_url, api_key):
                         set_env_file_invalid()
                     break
 
-        except urllib.error.URLError as e:
+        except error.URLError as e:
             print(f"Request failed: {e}")
             break
 
     print("Finished querying Zotero API")
-    return items
+    # The URL of the next page is only left if a request failed
+    return items, url is None
 
 
 def create_item_mapping(items):
@@ -171,22 +185,50 @@ def create_item_mapping(items):
 
 
 def create_collection_mapping(collections):
-    """Function to create a mapping of collection keys to their titles"""
+    """Function to create a mapping of collection keys to their titles and parent collections"""
     collection_mapping = {}
     for collection in collections:
         collection_data = collection.get("data", {})
         collection_key = collection_data.get("key")
         collection_title = collection_data.get("name")
-        collection_mapping[collection_key] = collection_title
+        # Zotero uses false for top-level collections
+        parent_collection = collection_data.get("parentCollection") or None
+        collection_mapping[collection_key] = {
+            "name": collection_title,
+            "parentCollection": parent_collection,
+        }
     return collection_mapping
 
 
+def create_collection_tree(collection_mapping):
+    """Function to create the list of collections with their parent collections"""
+    return [
+        {
+            "key": collection_key,
+            "name": collection_info["name"],
+            "parentCollection": collection_info["parentCollection"],
+        }
+        for collection_key, collection_info in collection_mapping.items()
+    ]
+
+
+def create_collection_mapping_from_tree(collection_tree):
+    """Function to create the mapping of collection keys from a saved list of collections"""
+    return {
+        collection["key"]: {
+            "name": collection["name"],
+            "parentCollection": collection["parentCollection"],
+        }
+        for collection in collection_tree
+    }
+
+
 def get_collections_info(collection_keys, collection_mapping):
     collections_info = []
     for collection_key in collection_keys:
-        collection_title = collection_mapping.get(collection_key, None)
-        if collection_title:
-            collections_info.append(collection_title)
+        collection_info = collection_mapping.get(collection_key)
+        if collection_info and collection_info["name"]:
+            collections_info.append(collection_info["name"])
     return collections_info
 
 
@@ -199,8 +241,15 @@ def get_parent_info(parent_item_key, item_mapping, collection_mapping):
         authors = parent_info.get("authors", "")
         collection_keys = parent_info.get("collections", [])
         collections = get_collections_info(collection_keys, collection_mapping)
+        # Annotations belong to attachments, so the top-level item is the last one found
+        top_item_key = parent_item_key
         parent_item_key = parent_info.get("parentItem")
-    return title, authors, collections
+    return title, authors, collections, collection_keys, top_item_key
+
+
+def get_tags(item_data):
+    """Function to get the names of the tags of an item"""
+    return [tag["tag"] for tag in item_data.get("tags", []) if tag.get("tag")]
 
 
 def extract_annotations(items, item_mapping, collection_mapping):
@@ -215,9 +264,13 @@ def extract_annotations(items, item_mapping, collection_mapping):
                 parent_item_key, item_mapping, collection_mapping
             )
             if parent_info:
-                parent_item_title, parent_item_authors, parent_item_collections = (
-                    parent_info
-                )
+                (
+                    parent_item_title,
+                    parent_item_authors,
+                    parent_item_collections,
+                    parent_item_collection_keys,
+                    top_item_key,
+                ) = parent_info
                 annotation = {
                     "key": item_data.get("key"),
                     "parentItem": {
@@ -225,11 +278,16 @@ def extract_annotations(items, item_mapping, collection_mapping):
                         "title": parent_item_title,
                         "authors": parent_item_authors,
                         "collections": parent_item_collections,
+                        "collectionKeys": parent_item_collection_keys,
+                        "topKey": top_item_key,
                     },
                     "annotationText": item_data.get("annotationText"),
                     "annotationComment": item_data.get("annotationComment"),
                     "annotationColor": item_data.get("annotationColor"),
                     "annotationPageLabel": item_data.get("annotationPageLabel"),
+                    "annotationSortIndex": item_data.get("annotationSortIndex"),
+                    "dateModified": item_data.get("dateModified"),
+                    "tags": get_tags(item_data),
                 }
                 annotations.append(annotation)
     print("Finished extracting annotations")
@@ -248,9 +306,13 @@ def extract_notes(items, item_mapping, collection_mapping):
                 parent_item_key, item_mapping, collection_mapping
             )
             if parent_info:
-                parent_item_title, parent_item_authors, parent_item_collections = (
-                    parent_info
-                )
+                (
+                    parent_item_title,
+                    parent_item_authors,
+                    parent_item_collections,
+                    parent_item_collection_keys,
+                    top_item_key,
+                ) = parent_info
                 note_content = item_data.get("note", "")
                 # Remove HTML tags and decode any HTML entities (e.g., &amp;, &lt;)
                 plain_text_note = re.sub(
@@ -264,51 +326,49 @@ def extract_notes(items, item_mapping, collection_mapping):
                         "title": parent_item_title,
                         "authors": parent_item_authors,
                         "collections": parent_item_collections,
+                        "collectionKeys": parent_item_collection_keys,
+                        "topKey": top_item_key,
                     },
                     "note": plain_text_note,
+                    "dateModified": item_data.get("dateModified"),
+                    "tags": get_tags(item_data),
                 }
                 notes.append(note)
     print("Finished extracting notes")
     return notes
 
 
-def load_from_json(filename):
-    """Function to load existing data from a JSON file, or return an empty list if the file doesn't exist"""
-    if os.path.exists(filename):
-        with open(filename, "r") as f:
-            return json.load(f)
-    return []
-
-
-def save_to_json(items, filename="items.json"):
-    """Function to save items to a JSON file, appending items with unique keys"""
-    existing_items = load_from_json(filename)
-
-    # Create a set of existing item keys to avoid duplicates
-    existing_keys = {item["key"] for item in existing_items}
-
-    # Filter out items that already exist in the JSON file based on their key
-    new_items = [item for item in items if item["key"] not in existing_keys]
+def save_to_store(annotations, notes, data_dir="data"):
+    """Function to save annotations and notes to the data store, refreshing existing items and keeping their groups"""
+    new_item_count, refreshed_item_count = update_store(annotations, notes, data_dir)
+    if new_item_count or refreshed_item_count:
+        print(
+            f"{new_item_count} new and {refreshed_item_count} updated items saved to {data_dir}"
+        )
+    else:
+        print("No new items to add. All items are up to date.")
 
-    if new_items:
-        # Append the new items to the existing ones
-        existing_items.extend(new_items)
 
-        # Create the directory if it doesn't exist
-        dirname = os.path.dirname(filename)
-        if dirname:
-            os.makedirs(dirname, exist_ok=True)
+def annotations_exporter(progress_callback=None):
+    """Fetch the annotations and notes from the Zotero API and save them to the data store.
 
-        # Save the updated list back to the JSON file
-        with open(filename, "w") as f:
-            json.dump(existing_items, f, indent=4, ensure_ascii=False)
-        print(f"Items saved to {filename}")
-    else:
-        print("No new items to add. All items already exist.")
+    If given, progress_callback is called with a message and the fraction of the
+    sync that is done (or None if unknown) whenever the sync progresses.
+    """
+    print("Starting the Zotero Annotations Exporter")
 
+    def report_progress(message, fraction=None):
+        if progress_callback:
+            progress_callback(message, fraction)
 
-def annotations_exporter():
-    print("Starting the Zotero Annotations Exporter")
+    def report_fetch_progress(fetched_count, total_count):
+        if total_count:
+            report_progress(
+                f"{fetched_count} of {total_count} items fetched",
+                fetched_count / total_count,
+            )
+        else:
+            report_progress(f"{fetched_count} items fetched")
 
     api_vars = load_env_file()
     lib_type = api_vars["ZOTERO_LIBRARY_TYPE"]
@@ -321,17 +381,25 @@ def annotations_exporter():
         return 1
 
     api_key = api_vars["ZOTERO_API_KEY"]
-    items = fetch_items(items_url_part, api_key)
-    collections = fetch_items(collections_url_part, api_key)
+    items, _is_complete = fetch_items(items_url_part, api_key, report_fetch_progress)
+    report_progress("Fetching collections...")
+    collections, are_collections_complete = fetch_items(collections_url_part, api_key)
     if items:
+        report_progress("Saving annotations and notes...")
         item_mapping = create_item_mapping(items)
-        collection_mapping = create_collection_mapping(collections)
+        # A partial collection tree would hide collections from the filter and remove
+        # the collection names of the items until the next sync
+        if are_collections_complete:
+            collection_mapping = create_collection_mapping(collections)
+            save_collections(create_collection_tree(collection_mapping))
+            print("Collections saved to data")
+        else:
+            collection_mapping = create_collection_mapping_from_tree(load_collections())
+            print("Collections could not be fetched completely, using the saved ones")
 
         annotations = extract_annotations(items, item_mapping, collection_mapping)
-        save_to_json(annotations, "data/annotations.json")
-
         notes = extract_notes(items, item_mapping, collection_mapping)
-        save_to_json(notes, "data/notes.json")
+        save_to_store(annotations, notes)
     else:
         print("No items fetched. Exiting...")
 